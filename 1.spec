@@ -1,44 +1,52 @@
 # -*- mode: python ; coding: utf-8 -*-
+# Builds both front-ends: dist/1 (full client, 1.py) and dist/gui (minimal client, GUI/1.py).
+# Each Analysis follows only its own imports; the minimal client never reaches
+# jack_chat.app/core/storage (it shares protocol and view), and the excludes keep it that way.
 
 
-a = Analysis(
-    ['1.py'],
-    pathex=[],
-    binaries=[],
-    datas=[],
-    hiddenimports=[],
-    hookspath=[],
-    hooksconfig={},
-    runtime_hooks=[],
-    excludes=[],
-    noarchive=False,
-    optimize=0,
-)
-pyz = PYZ(a.pure)
+def build(script, name, excludes=()):
+    a = Analysis(
+        [script],
+        pathex=['.'],
+        binaries=[],
+        datas=[],
+        hiddenimports=[],
+        hookspath=[],
+        hooksconfig={},
+        runtime_hooks=[],
+        excludes=list(excludes),
+        noarchive=False,
+        optimize=0,
+    )
+    pyz = PYZ(a.pure)
 
-exe = EXE(
-    pyz,
-    a.scripts,
-    [],
-    exclude_binaries=True,
-    name='1',
-    debug=False,
-    bootloader_ignore_signals=False,
-    strip=False,
-    upx=True,
-    console=True,
-    disable_windowed_traceback=False,
-    argv_emulation=False,
-    target_arch=None,
-    codesign_identity=None,
-    entitlements_file=None,
-)
-coll = COLLECT(
-    exe,
-    a.binaries,
-    a.datas,
-    strip=False,
-    upx=True,
-    upx_exclude=[],
-    name='1',
-)
+    exe = EXE(
+        pyz,
+        a.scripts,
+        [],
+        exclude_binaries=True,
+        name=name,
+        debug=False,
+        bootloader_ignore_signals=False,
+        strip=False,
+        upx=True,
+        console=True,
+        disable_windowed_traceback=False,
+        argv_emulation=False,
+        target_arch=None,
+        codesign_identity=None,
+        entitlements_file=None,
+    )
+    return COLLECT(
+        exe,
+        a.binaries,
+        a.datas,
+        strip=False,
+        upx=True,
+        upx_exclude=[],
+        name=name,
+    )
+
+
+build('1.py', '1')
+build('GUI/1.py', 'gui', excludes=['jack_chat.app', 'jack_chat.core', 'jack_chat.storage', 'sqlite3'])
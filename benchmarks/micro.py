@@ -0,0 +1,245 @@
+"""Micro-benchmarks for the per-message hot path in jack_chat/app.py, with regression gating.
+
+Each benchmark calls the real ChatApp method on an instance built without
+running __init__ (no prompts, no broker). Benchmarks that reach the chat
+display render through a real ChatView over a Tk Text widget, so they are
+skipped when there is no display. Timings are the best of several runs, each
+calibrated to take at least MIN_RUN_TIME seconds.
+
+    python benchmarks/micro.py --save          # record a baseline for this machine
+    python benchmarks/micro.py                 # compare, exit 1 on regression
+    python benchmarks/micro.py -k persist -t 0.3
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tkinter as tk
+from tkinter import font
+
+from _app import load_app
+
+app = load_app()
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+MIN_RUN_TIME = 0.02
+RUNS = 9
+
+
+class StubWidget:
+    """Stands in for Tk widgets on paths that don't need a real one"""
+    def tag_config(self, *args, **kwargs):
+        pass
+
+    def after(self, ms, func=None, *args):
+        pass
+
+    def after_cancel(self, job):
+        pass
+
+    def get(self):
+        return "hello there, this is a fairly typical chat line"
+
+    def delete(self, *args):
+        pass
+
+
+class NullClient:
+    def publish(self, topic, payload=None, qos=0, retain=False, properties=None):
+        pass
+
+
+class Message:
+    def __init__(self, topic, payload):
+        self.topic = topic
+        self.payload = payload
+        self.properties = None
+
+
+def make_app(mqtt_v5=False):
+    """A headless ChatApp whose publishes and Tk calls go nowhere"""
+    chat = app.create_headless_app("bench", master=StubWidget())
+    chat.mqtt_v5 = mqtt_v5
+    chat.client = NullClient()
+    chat.message_entry = StubWidget()
+    chat.topic_alias_max = 10
+    chat.lanes = app.LaneScheduler(chat.master)
+    chat.user_chatrooms = [f"room-{i}" for i in range(50)]
+    return chat
+
+
+def bench_send_message():
+    chat = make_app()
+    return chat.send_message
+
+
+def bench_send_message_v5():
+    chat = make_app(mqtt_v5=True)
+    return chat.send_message
+
+
+def make_display_app(lines=0):
+    """A headless ChatApp rendering into a real ChatView, with lines of filler already shown"""
+    root = tk.Tk()
+    root.withdraw()
+    chat = make_app()
+    chat.master = root  # The lanes keep their stub master; benchmarks drain them directly
+    chat.view = app.ChatView(root, tk.Text(root), chat.lanes, fonts={
+        "timestamp": font.Font(root, size=10, weight="bold"),
+        "username": font.Font(root, size=11, weight="bold"),
+        "message": font.Font(root, size=10),
+        "deleted": font.Font(root, size=10, slant="italic"),
+    })
+    chat.view.listener = chat.message_rendered
+    chat.view.configure_tags()
+    for i in range(lines):
+        chat.view.text.insert(tk.END, f"\n[12:00:00] user{i % 7}: filler line {i}\n")
+    return chat
+
+
+def bench_on_message():
+    chat = make_display_app()
+    msg = Message(chat.chat_topic, json.dumps({
+        "username": "alice", "message": "hello there, this is a fairly typical chat line",
+        "timestamp": "12:00:00", "color": "#63B8FF"
+    }).encode())
+    return lambda: (chat.on_message(None, None, msg), chat.lanes.drain())
+
+
+def bench_on_message_rules():
+    chat = make_display_app()
+    chat.rules = app.ChatRules("bench", [f"keyword{i}" for i in range(500)],
+                               [f"muted{i}" for i in range(500)], ["re:buy\\s+now", "spam"])
+    msg = Message(chat.chat_topic, json.dumps({
+        "username": "alice", "message": "hello there bench, this line mentions keyword42 and keyword499",
+        "timestamp": "12:00:00"
+    }).encode())
+    return lambda: (chat.on_message(None, None, msg), chat.lanes.drain())
+
+
+def bench_get_tag_for_username():
+    chat = make_display_app()
+    return lambda: chat.get_tag_for_username("alice")
+
+
+def bench_store_invitation():
+    chat = make_app()
+    invite = {"type": "invitation", "from": "bench", "chatroom": "general", "timestamp": "12:00:00 - 01/01/2026"}
+
+    def run():
+        chat.store_invitation("alice", invite)
+        chat.remove_stored_invitation("alice", "general", "bench")
+    return run
+
+
+def bench_save_user_chatrooms():
+    chat = make_app()
+    return chat.save_user_chatrooms
+
+
+def bench_load_user_chatrooms():
+    chat = make_app()
+    chat.save_user_chatrooms()
+    return chat.load_user_chatrooms
+
+
+def make_display_bench(lines):
+    def setup():
+        chat = make_display_app(lines)
+        tag = chat.get_tag_for_username("alice")
+        return lambda: chat.update_chat_display("12:00:00", "alice", "hello there", tag)
+    return setup
+
+
+BENCHMARKS = {
+    "send_message": bench_send_message,
+    "send_message_v5": bench_send_message_v5,
+    "on_message_decode": bench_on_message,
+    "on_message_rules[1000]": bench_on_message_rules,
+    "get_tag_for_username": bench_get_tag_for_username,
+    "update_chat_display[0]": make_display_bench(0),
+    "update_chat_display[1000]": make_display_bench(1000),
+    # The display is trimmed to MAX_DISPLAY_LINES, so that is the largest size a message lands in
+    f"update_chat_display[{app.MAX_DISPLAY_LINES}]": make_display_bench(app.MAX_DISPLAY_LINES),
+    "persist_invitation": bench_store_invitation,
+    "persist_save_chatrooms": bench_save_user_chatrooms,
+    "persist_load_chatrooms": bench_load_user_chatrooms,
+}
+
+
+def measure(func):
+    """Best seconds per call over RUNS calibrated runs (least noisy for gating)"""
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= MIN_RUN_TIME:
+            break
+        loops *= 2
+
+    timings = [elapsed / loops]
+    for _ in range(RUNS - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        timings.append((time.perf_counter() - start) / loops)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-k", "--filter", default="", help="only run benchmarks whose name contains this")
+    parser.add_argument("-t", "--threshold", type=float, default=0.2,
+                        help="allowed slowdown against the baseline (0.2 = 20%%)")
+    parser.add_argument("--io-threshold", type=float, default=0.5,
+                        help="allowed slowdown for the disk-bound persist_* benchmarks")
+    parser.add_argument("--save", action="store_true", help="store results as the new baseline")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    # Keep the persistence benchmarks away from the real files in ~
+    tmp_dir = tempfile.mkdtemp(prefix="jack-chat-bench-")
+    app.INVITATIONS_FILE = os.path.join(tmp_dir, "invitations.json")
+    app.CHATROOMS_FILE = os.path.join(tmp_dir, "rooms.json")
+
+    results, regressions = {}, []
+    for name, setup in BENCHMARKS.items():
+        if args.filter not in name:
+            continue
+        try:
+            func = setup()
+        except tk.TclError as e:
+            print(f"{name:<28} skipped ({e})")
+            continue
+
+        results[name] = seconds = measure(func)
+        line = f"{name:<28} {seconds * 1e6:10.2f} us"
+        if name in baseline:
+            change = seconds / baseline[name] - 1
+            line += f"  {change:+7.1%}"
+            threshold = args.io_threshold if name.startswith("persist_") else args.threshold
+            if change > threshold:
+                line += "  REGRESSION"
+                regressions.append(name)
+        print(line)
+
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=4)
+        print(f"Baseline written to {args.baseline}")
+    elif regressions:
+        print(f"{len(regressions)} benchmark(s) regressed: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
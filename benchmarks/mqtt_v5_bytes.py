@@ -0,0 +1,88 @@
+"""Compare bytes on the wire for chat publishes under MQTT 3.1.1 and v5.
+
+Runs the client's own ChatApp.publish against a local broker, e.g.:
+
+    mosquitto -p 1883 &    (or: python benchmarks/standin_broker.py --port 1883 &)
+    python benchmarks/mqtt_v5_bytes.py --host localhost --port 1883 -n 1000
+"""
+import argparse
+import threading
+import time
+from datetime import datetime
+
+import paho.mqtt.client as mqtt
+
+from _app import load_app
+
+app = load_app()
+
+
+class Publisher:
+    """Just enough of ChatApp to drive its publish() method"""
+    publish = app.ChatApp.publish
+
+    def __init__(self, mqtt_v5):
+        self.mqtt_v5 = mqtt_v5
+        self.client = mqtt.Client(protocol=mqtt.MQTTv5 if mqtt_v5 else mqtt.MQTTv311)
+        self.topic_aliases = {}
+        self.topic_alias_max = 0
+        self.alias_lock = threading.Lock()
+        self.bytes_sent = 0
+        self.connected = threading.Event()
+        self.client.on_connect = self.on_connect
+
+        # Count every outgoing PUBLISH packet as paho queues it
+        queue_packet = self.client._packet_queue
+
+        def counting_queue(command, packet, mid, qos, info=None):
+            if command & 0xF0 == mqtt.PUBLISH:
+                self.bytes_sent += len(packet)
+            return queue_packet(command, packet, mid, qos, info)
+
+        self.client._packet_queue = counting_queue
+
+    def on_connect(self, client, userdata, flags, rc, properties=None):
+        self.topic_alias_max = getattr(properties, "TopicAliasMaximum", 0)
+        self.connected.set()
+
+
+def run(mqtt_v5, host, port, count, room):
+    pub = Publisher(mqtt_v5)
+    pub.client.connect(host, port, 60)
+    pub.client.loop_start()
+    if not pub.connected.wait(5):
+        raise SystemExit(f"Could not connect to {host}:{port}")
+
+    topic = f"{app.BASE_TOPIC}/{room}"
+    for i in range(count):
+        payload = {
+            "username": "bench",
+            "message": f"message number {i}",
+            "timestamp": datetime.now().strftime("%H:%M:%S")
+        }
+        pub.publish(topic, payload, expiry=app.CHAT_MESSAGE_EXPIRY, metadata={"color": "#63B8FF"})
+
+    time.sleep(0.5)
+    pub.client.disconnect()
+    pub.client.loop_stop()
+    return pub.bytes_sent, pub.topic_alias_max
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("-n", "--count", type=int, default=1000)
+    parser.add_argument("--room", default="a-reasonably-long-benchmark-room-name")
+    args = parser.parse_args()
+
+    v311, _ = run(False, args.host, args.port, args.count, args.room)
+    v5, alias_max = run(True, args.host, args.port, args.count, args.room)
+
+    print(f"MQTT 3.1.1: {v311} bytes ({v311 / args.count:.1f} per message)")
+    print(f"MQTT v5:    {v5} bytes ({v5 / args.count:.1f} per message, topic alias max {alias_max})")
+    print(f"Saving:     {100 * (v311 - v5) / v311:.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""Minimal MQTT 3.1.1 and v5 broker stand-in for local tests and benchmarks.
+
+Supports CONNECT, SUBSCRIBE/UNSUBSCRIBE (exact topics, + / # filters and
+$share/<group>/ filters), QoS 0 PUBLISH fan-out, PINGREQ and DISCONNECT. v5
+clients may use up to TOPIC_ALIAS_MAX topic aliases; other v5 properties are
+accepted and dropped. --delay adds latency to every
+packet it forwards, so several instances on different ports can play
+brokers of different quality:
+
+    python benchmarks/standin_broker.py --port 18831 --delay 0.005 &
+    python benchmarks/standin_broker.py --port 18832 --delay 0.080 &
+"""
+import argparse
+import asyncio
+import struct
+
+import paho.mqtt.client as mqtt
+
+CONNECT, CONNACK, PUBLISH, SUBSCRIBE, SUBACK = 0x10, 0x20, 0x30, 0x80, 0x90
+UNSUBSCRIBE, UNSUBACK, PINGREQ, PINGRESP, DISCONNECT = 0xA0, 0xB0, 0xC0, 0xD0, 0xE0
+TOPIC_ALIAS_MAX = 10
+
+
+def encode_length(length):
+    out = bytearray()
+    while True:
+        byte, length = length % 128, length // 128
+        out.append(byte | (0x80 if length else 0))
+        if not length:
+            return bytes(out)
+
+
+def decode_length(data, pos):
+    """Variable byte integer at pos; returns (value, position after it)"""
+    value, multiplier = 0, 1
+    while True:
+        byte = data[pos]
+        pos += 1
+        value += (byte & 0x7F) * multiplier
+        multiplier *= 128
+        if not byte & 0x80:
+            return value, pos
+
+
+def topic_alias(properties):
+    """The Topic Alias (0x23) in a v5 PUBLISH property block, or None"""
+    pos = 0
+    while pos < len(properties):
+        ident = properties[pos]
+        if ident == 0x23:
+            return struct.unpack_from("!H", properties, pos + 1)[0]
+        if ident in (0x01, 0x24, 0x25, 0x28, 0x29, 0x2A, 0x17, 0x19):
+            pos += 2
+        elif ident in (0x13, 0x21, 0x22):
+            pos += 3
+        elif ident in (0x02, 0x11, 0x18, 0x27):
+            pos += 5
+        elif ident == 0x0B:
+            pos = decode_length(properties, pos + 1)[1]
+        elif ident == 0x26:
+            (length,) = struct.unpack_from("!H", properties, pos + 1)
+            pos += 3 + length
+            (length,) = struct.unpack_from("!H", properties, pos)
+            pos += 2 + length
+        else:  # UTF-8 string or binary data
+            (length,) = struct.unpack_from("!H", properties, pos + 1)
+            pos += 3 + length
+    return None
+
+
+class StandinBroker:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.subscriptions = {}  # writer -> set of filters
+        self.versions = {}  # writer -> protocol level (4 = 3.1.1, 5 = v5)
+        self.shared_turn = {}  # (group, filter) -> deliveries so far
+
+    async def read_packet(self, reader):
+        header = (await reader.readexactly(1))[0]
+        length, multiplier = 0, 1
+        while True:
+            byte = (await reader.readexactly(1))[0]
+            length += (byte & 0x7F) * multiplier
+            multiplier *= 128
+            if not byte & 0x80:
+                break
+        return header, await reader.readexactly(length)
+
+    async def send(self, writer, header, body=b""):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        writer.write(bytes([header]) + encode_length(len(body)) + body)
+        await writer.drain()
+
+    def targets(self, topic):
+        """Subscribers of a topic; each $share group gets it on one member, in turn"""
+        targets, groups = [], {}
+        for writer, filters in list(self.subscriptions.items()):
+            for topic_filter in filters:
+                if topic_filter.startswith("$share/"):
+                    _, group, shared_filter = topic_filter.split("/", 2)
+                    if mqtt.topic_matches_sub(shared_filter, topic):
+                        groups.setdefault((group, shared_filter), []).append(writer)
+                elif mqtt.topic_matches_sub(topic_filter, topic):
+                    targets.append(writer)
+                    break
+        for key, members in groups.items():
+            turn = self.shared_turn.get(key, 0)
+            self.shared_turn[key] = turn + 1
+            targets.append(members[turn % len(members)])
+        return targets
+
+    async def handle(self, reader, writer):
+        self.subscriptions[writer] = set()
+        self.versions[writer] = 4
+        aliases = {}
+        try:
+            while True:
+                header, body = await self.read_packet(reader)
+                kind = header & 0xF0
+                v5 = self.versions[writer] == 5
+                if kind == CONNECT:
+                    self.versions[writer] = body[6]
+                    if body[6] == 5:
+                        await self.send(writer, CONNACK, b"\x00\x00\x03\x22" + struct.pack("!H", TOPIC_ALIAS_MAX))
+                    else:
+                        await self.send(writer, CONNACK, b"\x00\x00")
+                elif kind == SUBSCRIBE:
+                    packet_id, pos, granted = body[:2], 2, bytearray()
+                    if v5:
+                        pos = sum(decode_length(body, pos))
+                    while pos < len(body):
+                        (length,) = struct.unpack_from("!H", body, pos)
+                        self.subscriptions[writer].add(body[pos + 2:pos + 2 + length].decode())
+                        pos += 2 + length + 1
+                        granted.append(0)
+                    await self.send(writer, SUBACK, packet_id + (b"\x00" if v5 else b"") + bytes(granted))
+                elif kind == UNSUBSCRIBE:
+                    pos, count = 2, 0
+                    if v5:
+                        pos = sum(decode_length(body, pos))
+                    while pos < len(body):
+                        (length,) = struct.unpack_from("!H", body, pos)
+                        self.subscriptions[writer].discard(body[pos + 2:pos + 2 + length].decode())
+                        pos += 2 + length
+                        count += 1
+                    await self.send(writer, UNSUBACK, body[:2] + (b"\x00" + bytes(count) if v5 else b""))
+                elif kind == PUBLISH:
+                    (length,) = struct.unpack_from("!H", body)
+                    topic = body[2:2 + length].decode()
+                    offset = 2 + length + (2 if header & 0x06 else 0)
+                    if v5:
+                        size, start = decode_length(body, offset)
+                        offset = start + size
+                        alias = topic_alias(body[start:offset])
+                        if alias is not None:
+                            if topic:
+                                aliases[alias] = topic
+                            else:
+                                topic = aliases.get(alias, "")
+                    payload = body[offset:]
+                    for other in self.targets(topic):
+                        packet = struct.pack("!H", len(topic.encode())) + topic.encode()
+                        if self.versions.get(other) == 5:
+                            packet += b"\x00"  # No properties
+                        asyncio.ensure_future(self.send(other, PUBLISH, packet + payload))
+                elif kind == PINGREQ:
+                    await self.send(writer, PINGRESP)
+                elif kind == DISCONNECT:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.subscriptions.pop(writer, None)
+            self.versions.pop(writer, None)
+            writer.close()
+
+
+async def serve(port, delay):
+    broker = StandinBroker(delay)
+    server = await asyncio.start_server(broker.handle, "127.0.0.1", port)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds added to every packet sent")
+    args = parser.parse_args()
+    asyncio.run(serve(args.port, args.delay))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+"""Jack Chat: MQTT chat with Tkinter front-ends.
+
+protocol  wire format, MQTT settings and transports (no GUI imports)
+view      message lanes and chat rendering shared by both front-ends
+core      Tk-free client machinery used by the full client
+storage   files in the home directory and the message history store
+app       the full client (1.py)
+simple    the minimal client (GUI/1.py)
+
+Nothing is imported here, so each front-end, and its frozen build, only
+pulls in the modules it uses.
+"""
@@ -0,0 +1,1778 @@
+"""The full Jack Chat client."""
+import tkinter as tk
+from tkinter import scrolledtext, simpledialog, messagebox, colorchooser, font
+import json, time, threading, os, pickle, sys, argparse, uuid
+from collections import deque
+from datetime import datetime
+import random
+
+from paho.mqtt.properties import Properties
+from paho.mqtt.packettypes import PacketTypes
+
+from .protocol import (
+    COLORS, BASE_TOPIC, MQTT_BROKERS, MQTT_USERNAME, MQTT_PASSWORD, MQTT_V5, TRANSPORT,
+    BROKER_SELECTION, MIGRATE_MARGIN, CHAT_MESSAGE_EXPIRY, INVITATION_EXPIRY,
+    LoopbackBus, LoopbackClient, LoopbackMessage, BrokerProber,
+    create_mqtt_client, broker_address, choose_broker,
+    room_topic, clock, system_payload, decode_payload, chat_fields
+)
+from .core import (
+    CAPTURE_SECONDS, RECEIPT_REFRESH_MS,
+    TYPING_REPUBLISH, TYPING_IDLE, TYPING_TTL, TYPING_REFRESH_MS,
+    ChatRules, Diagnostics, ReadReceipts, TypingTracker,
+    TrafficCapture, read_capture, ReplayStats, HeadlessMaster, WorkerMaster
+)
+from .view import MAX_DISPLAY_LINES, LaneScheduler, RenderGovernor, ChatView
+from .storage import (
+    INVITATIONS_FILE, CHATROOMS_FILE, ROOM_ACTIVITY_FILE, RULES_FILE, SNAPSHOT_FILE,
+    HistoryStore, export_history, import_history
+)
+
+SNAPSHOT_MESSAGES = 50  # Rendered messages kept per room for warm start
+SNAPSHOT_INTERVAL_MS = 60 * 1000
+
+class HeadlessView:
+    """Stand-in for ChatView that keeps the rendered lines as text"""
+    def __init__(self):
+        self.lines = deque(maxlen=MAX_DISPLAY_LINES)
+        self.marks = {}
+        self.latest = None
+        self.governor = RenderGovernor()
+        self.listener = None
+    
+    def tag_for(self, username):
+        return "system" if username == "System" else f"user_{username}"
+    
+    def render(self, timestamp, username, message, message_id=None, highlights=()):
+        self.show(timestamp, username, message, self.tag_for(username), message_id, highlights)
+    
+    def show(self, timestamp, username, message, tag_name, message_id=None, highlights=()):
+        self.lines.append(f"[{timestamp}] {username}: {message}")
+        if self.listener is not None:
+            self.listener(timestamp, username, message, tag_name, message_id)
+    
+    def flush(self):
+        pass
+    
+    def change(self, message_id, author, new_text, tags="message"):
+        return False
+
+def create_headless_app(username="replay", chatroom="general", master=None, bus=None, share_group=None,
+                        transport="loopback", broker=None, history=None):
+    """A ChatApp without windows, for replays, benchmarks and workers.
+    
+    On the default loopback transport it runs on a private (or the given) bus
+    and a virtual clock. Any other transport connects to a real broker (broker,
+    else the room's broker) with MQTT v5 and runs on a WorkerMaster; call
+    app.master.run() to process messages. With share_group the app joins the
+    room as a worker through $share/<group>/..., so the workers of a group split
+    the room's messages; pass a HistoryStore as history to archive them.
+    """
+    app = object.__new__(ChatApp)
+    app.username, app.chatroom = username, chatroom
+    app.my_color, app.my_color_name = COLORS["blue"], "blue"
+    app.share_group = share_group
+    if transport == "loopback":
+        app.master = master or HeadlessMaster()
+        app.mqtt_v5 = False
+        app.client = LoopbackClient(bus or LoopbackBus())
+    else:
+        app.master = master or WorkerMaster()
+        app.mqtt_v5 = True  # Shared subscriptions are an MQTT v5 feature
+        app.client = create_mqtt_client(transport, mqtt_v5=True)
+        app.client.username_pw_set(MQTT_USERNAME, MQTT_PASSWORD)
+    app.chat_topic = room_topic(chatroom)
+    app.room_visit = 0
+    app.typing_topic = f"{app.chat_topic}/typing"
+    app.receipt_topic = f"{app.chat_topic}/receipts"
+    app.receipts = ReadReceipts()
+    app.personal_topic = f"{BASE_TOPIC}/invites/{username}"
+    app.typing_tracker = TypingTracker()
+    app.typing_sent_at = 0
+    app.typing_stop_job = None
+    app.topic_aliases, app.topic_alias_max = {}, 0
+    app.alias_lock = threading.Lock()
+    app.room_activity = {}
+    app.recent_messages = {}
+    app.snapshot_dirty = False
+    app.user_chatrooms = [chatroom]
+    app.rules = ChatRules(username)
+    app.diagnostics = Diagnostics(app.master)
+    # Headless, frame deadlines run on the master's clock (measured callback time, or the modeled cost)
+    clock = app.master.clock if isinstance(app.master, HeadlessMaster) else time.perf_counter
+    app.lanes = LaneScheduler(app.master, clock=clock)
+    app.capture = None
+    app.history = history
+    app.my_message_ids = []
+    app.view = HeadlessView()
+    app.view.listener = app.message_rendered
+    app.rendered_lines = app.view.lines
+    app.on_rendered = None
+    app.show_invitation_notification = lambda from_user, chatroom, stored=False: \
+        app.rendered_lines.append(f"[invitation] {from_user} invited you to {chatroom}")
+    if share_group:
+        def subscribe(client, userdata, flags, rc, properties=None):
+            client.subscribe(app.subscription_topic(app.chat_topic))  # Again after every reconnect
+        
+        app.client.on_connect = subscribe
+        app.client.on_message = app.on_message
+        if transport == "loopback":
+            app.client.connect()
+        else:
+            if broker is None:
+                broker = choose_broker(chatroom, MQTT_BROKERS, {}) if transport == "tcp" else broker_address(transport)
+            app.client.connect(*broker, 60)
+            threading.Thread(target=app.client.loop_forever, daemon=True).start()
+    return app
+
+def replay_headless(path, speed=0):
+    """Replay a capture through the message pipeline without a window; returns a report"""
+    master = HeadlessMaster()
+    app = create_headless_app(master=master)
+    stats = ReplayStats(clock=master.clock)
+    app.on_rendered = stats.render
+    
+    def inject(topic, payload):
+        stats.inject(payload)
+        app.on_message(app.client, None, LoopbackMessage(topic, payload, None, master.clock()))
+    
+    for offset, topic, payload in read_capture(path):
+        master.after(offset / speed * 1000 if speed else 0, inject, topic, payload)
+    
+    wall = time.perf_counter()
+    master.run()
+    wall = time.perf_counter() - wall
+    return (f"{stats.report()} (measured callback time on the capture's schedule); "
+            f"wall clock {wall:.3f}s, {stats.rendered / wall if wall else 0:.0f} msg/s")
+
+class RoomIndex:
+    """Substring search over room names backed by a lazily built trigram index"""
+    def __init__(self, rooms):
+        self.rooms = rooms  # Already in display order
+        self.trigrams = None
+        self.last_query = ""
+        self.last_results = rooms
+    
+    def build(self):
+        self.trigrams = {}
+        for i, room in enumerate(self.rooms):
+            name = room.lower()
+            for j in range(len(name) - 2):
+                self.trigrams.setdefault(name[j:j + 3], set()).add(i)
+    
+    def search(self, query):
+        query = query.lower()
+        if not query:
+            results = self.rooms
+        elif self.last_query and query.startswith(self.last_query):
+            # Typing more only narrows the previous result set
+            results = [room for room in self.last_results if query in room.lower()]
+        elif len(query) >= 3:
+            if self.trigrams is None:
+                self.build()
+            candidates = None
+            for j in range(len(query) - 2):
+                hits = self.trigrams.get(query[j:j + 3], set())
+                candidates = hits if candidates is None else candidates & hits
+                if not candidates:
+                    break
+            results = [self.rooms[i] for i in sorted(candidates or ())
+                       if query in self.rooms[i].lower()]
+        else:
+            results = [room for room in self.rooms if query in room.lower()]
+        
+        self.last_query, self.last_results = query, results
+        return results
+
+class VirtualRoomList(tk.Frame):
+    """Scrollable room list that only creates widgets for the visible rows"""
+    ROW_HEIGHT = 40
+    
+    def __init__(self, parent, current_room, on_join, on_remove):
+        super().__init__(parent, bg="#1E1E1E")
+        self.current_room = current_room
+        self.on_join = on_join
+        self.on_remove = on_remove
+        self.items = []
+        self.offset = 0
+        self.rows = []
+        self.visible = 0
+        
+        self.scrollbar = tk.Scrollbar(self, command=self.on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.rows_frame = tk.Frame(self, bg="#1E1E1E")
+        self.rows_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        
+        self.rows_frame.bind("<Configure>", self.on_resize)
+        for widget in (self.rows_frame, self.scrollbar):
+            widget.bind("<MouseWheel>", self.on_mousewheel)
+            widget.bind("<Button-4>", lambda e: self.scroll_to(self.offset - 3))
+            widget.bind("<Button-5>", lambda e: self.scroll_to(self.offset + 3))
+    
+    def set_items(self, items):
+        self.items = items
+        self.offset = 0
+        self.render()
+    
+    def make_row(self):
+        row = tk.Frame(self.rows_frame, bg="#242424", padx=10, pady=4)
+        label = tk.Label(row, font=("Arial", 11), bg="#242424", width=20, anchor="w")
+        label.pack(side=tk.LEFT, padx=5)
+        join_btn = tk.Button(row, text="Join", bg="#2196F3", fg="#FFFFFF")
+        join_btn.pack(side=tk.LEFT, padx=5)
+        remove_btn = tk.Button(row, text="Remove", bg="#FF5722", fg="#FFFFFF")
+        remove_btn.pack(side=tk.LEFT, padx=5)
+        for widget in (row, label):
+            widget.bind("<MouseWheel>", self.on_mousewheel)
+            widget.bind("<Button-4>", lambda e: self.scroll_to(self.offset - 3))
+            widget.bind("<Button-5>", lambda e: self.scroll_to(self.offset + 3))
+        return row, label, join_btn, remove_btn
+    
+    def on_resize(self, event):
+        # Grow the row pool to fill the viewport; rows are never destroyed
+        wanted = max(1, event.height // self.ROW_HEIGHT)
+        while len(self.rows) < wanted:
+            self.rows.append(self.make_row())
+        self.visible = wanted
+        self.render()
+    
+    def render(self):
+        visible = self.visible
+        self.offset = max(0, min(self.offset, len(self.items) - visible))
+        for i, (row, label, join_btn, remove_btn) in enumerate(self.rows):
+            index = self.offset + i
+            if i >= visible or index >= len(self.items):
+                row.place_forget()
+                continue
+            
+            room = self.items[index]
+            is_current = room == self.current_room
+            state = tk.DISABLED if is_current else tk.NORMAL
+            label.config(text=room, fg="#4AFF65" if is_current else "#FFFFFF")
+            join_btn.config(state=state, command=lambda r=room: self.on_join(r))
+            remove_btn.config(state=state, command=lambda r=room: self.on_remove(r))
+            row.place(x=0, y=i * self.ROW_HEIGHT, relwidth=1, height=self.ROW_HEIGHT - 2)
+        
+        if self.items:
+            first = self.offset / len(self.items)
+            last = min(1.0, (self.offset + visible) / len(self.items))
+            self.scrollbar.set(first, last)
+        else:
+            self.scrollbar.set(0, 1)
+    
+    def scroll_to(self, offset):
+        self.offset = offset
+        self.render()
+    
+    def on_scrollbar(self, action, amount, unit=None):
+        visible = max(1, self.visible)
+        if action == "moveto":
+            self.scroll_to(int(float(amount) * len(self.items)))
+        elif unit == "pages":
+            self.scroll_to(self.offset + int(amount) * visible)
+        else:
+            self.scroll_to(self.offset + int(amount))
+    
+    def on_mousewheel(self, event):
+        self.scroll_to(self.offset - (1 if event.delta > 0 else -1) * 3)
+
+class ChatApp:
+    def __init__(self, master):
+        self.master = master
+        self.master.title("Jack Chat")
+        self.master.geometry("900x600")
+        self.master.configure(bg="#1E1E1E")
+        self.master.protocol("WM_DELETE_WINDOW", self.on_closing)
+        self.menu_visible = False
+        self.mqtt_v5 = MQTT_V5
+        self.share_group = None  # Only headless workers split a room (see create_headless_app)
+        self.broker_probes = {}
+        self.failed_brokers = set()
+        self.prober = None
+        self.migration = None  # Background connect to the broker we are moving to
+        
+        # Returning users start from the last session's snapshot instead of prompts
+        self.snapshot = self.load_snapshot()
+        self.recent_messages = {}
+        self.my_message_ids = []
+        self.snapshot_dirty = False
+        self.room_visit = 0  # Bumped on every room switch; queued work from an older visit is dropped
+        
+        # Set up initial variables
+        if self.snapshot:
+            self.restore_identity(self.snapshot)
+        else:
+            self.get_user_info()
+        
+        # Initialize chatroom history
+        self.user_chatrooms = self.load_user_chatrooms()
+        self.room_activity = self.load_room_activity()
+        self.rules = self.load_rules()
+        self.history = HistoryStore()
+        self.diagnostics = Diagnostics(self.master)
+        self.lanes = LaneScheduler(self.master)
+        self.on_rendered = None  # Called with (username, message) once a line is on screen, in either mode
+        self.capture = None
+        
+        # Initialize app components
+        self.broker = choose_broker(self.chatroom, MQTT_BROKERS, {})
+        self.setup_mqtt_client()
+        self.create_widgets()
+        if self.snapshot:
+            self.paint_from_snapshot()
+        self.connect_to_mqtt()
+        self.start_broker_probing()
+        self.check_pending_invitations()
+        
+        self.add_chatroom_to_history(self.chatroom)
+        self.master.after(SNAPSHOT_INTERVAL_MS, self.periodic_snapshot)
+    
+    def get_user_info(self):
+        # Get username and chatroom
+        self.username = simpledialog.askstring("Username", "Enter your username:", parent=self.master)
+        if not self.username:
+            messagebox.showerror("Error", "Username cannot be empty!")
+            self.master.destroy()
+            return
+            
+        self.chatroom = simpledialog.askstring("Chat Room", "Enter chatroom name to join:", parent=self.master)
+        if not self.chatroom:
+            messagebox.showerror("Error", "Chatroom name cannot be empty!")
+            self.master.destroy()
+            return
+            
+        # Choose a color for this user
+        color_names = list(COLORS.keys())
+        color_names.remove("white")  # Don't use white
+        self.my_color_name = random.choice(color_names)
+        self.my_color = COLORS[self.my_color_name]
+    
+    def load_snapshot(self):
+        """Read the last session snapshot, if there is one"""
+        try:
+            if not os.path.exists(SNAPSHOT_FILE) or os.path.getsize(SNAPSHOT_FILE) == 0:
+                return None
+            # A few KB at most (SNAPSHOT_MESSAGES per room), so one plain read is cheapest
+            with open(SNAPSHOT_FILE, 'rb') as f:
+                snapshot = json.loads(f.read())
+            if snapshot.get("username") and snapshot.get("chatroom"):
+                return snapshot
+        except Exception as e:
+            print(f"Error loading snapshot: {e}")
+        return None
+    
+    def restore_identity(self, snapshot):
+        self.username = snapshot["username"]
+        self.chatroom = snapshot["chatroom"]
+        self.my_color_name = snapshot.get("color_name", "custom")
+        self.my_color = snapshot.get("color", COLORS["blue"])
+        for room, messages in snapshot.get("rooms", {}).items():
+            self.recent_messages[room] = deque(
+                (tuple(m) for m in messages), maxlen=SNAPSHOT_MESSAGES
+            )
+    
+    def paint_from_snapshot(self):
+        """Show the last session's messages before the broker connection completes"""
+        self.paint_history(self.chatroom)
+        self.view.append_system("--- Restored from your last session ---")
+        self.set_status(f"Reconnecting as {self.username} in {self.chatroom}...")
+        self.master.update()
+    
+    def paint_history(self, chatroom):
+        """Render the remembered messages of a room into the (cleared) chat display"""
+        history = list(self.recent_messages.get(chatroom, ()))
+        self.recent_messages[chatroom] = deque(maxlen=SNAPSHOT_MESSAGES)
+        for timestamp, username, message, tag_name, *message_id in history:
+            if tag_name != "system":
+                tag_name = self.get_tag_for_username(username)
+            self.update_chat_display(timestamp, username, message, tag_name, *message_id)
+    
+    def save_snapshot(self):
+        """Write the session snapshot atomically"""
+        snapshot = {
+            "username": self.username,
+            "chatroom": self.chatroom,
+            "color": self.my_color,
+            "color_name": self.my_color_name,
+            "rooms": {room: list(messages) for room, messages in self.recent_messages.items()
+                      if messages and room in self.user_chatrooms}
+        }
+        try:
+            tmp_file = SNAPSHOT_FILE + ".tmp"
+            with open(tmp_file, 'w') as f:
+                json.dump(snapshot, f, separators=(",", ":"))
+            os.replace(tmp_file, SNAPSHOT_FILE)
+            self.snapshot_dirty = False
+        except Exception as e:
+            print(f"Error saving snapshot: {e}")
+    
+    def periodic_snapshot(self):
+        if self.snapshot_dirty:
+            self.save_snapshot()
+            self.history.flush()
+        self.master.after(SNAPSHOT_INTERVAL_MS, self.periodic_snapshot)
+    
+    def create_client(self):
+        client = create_mqtt_client(TRANSPORT, self.mqtt_v5)
+        client.user_data_set({"username": self.username, "chatroom": self.chatroom})
+        client.username_pw_set(MQTT_USERNAME, MQTT_PASSWORD)
+        client.on_connect = self.on_connect
+        client.on_message = self.on_message
+        return client
+    
+    def setup_mqtt_client(self):
+        self.client = self.create_client()
+        self.topic_aliases = {}
+        self.topic_alias_max = 0
+        self.alias_lock = threading.Lock()
+        self.personal_topic = f"{BASE_TOPIC}/invites/{self.username}"
+        self.chat_topic = room_topic(self.chatroom)
+        self.typing_topic = f"{self.chat_topic}/typing"
+        self.receipt_topic = f"{self.chat_topic}/receipts"
+        
+    def create_widgets(self):
+        # Define fonts
+        self.timestamp_font = font.Font(size=10, weight="bold")
+        self.username_font = font.Font(size=11, weight="bold")
+        self.message_font = font.Font(size=10)
+        self.deleted_font = font.Font(size=10, slant="italic")
+        self.button_font = font.Font(size=10, weight="bold")
+        
+        # Create layout frames
+        self.main_container = tk.Frame(self.master, bg="#1E1E1E")
+        self.main_container.pack(fill=tk.BOTH, expand=True)
+        
+        self.left_frame = tk.Frame(self.main_container, bg="#1E1E1E")
+        self.left_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        self.right_panel = tk.Frame(self.main_container, bg="#1E1E1E", width=50)
+        self.right_panel.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        # Create menu toggle button
+        self.menu_button = tk.Button(
+            self.right_panel, text="⚙️", font=("Arial", 16), bg="#333333", fg="#FFFFFF",
+            activebackground="#444444", relief=tk.FLAT, command=self.toggle_menu
+        )
+        self.menu_button.pack(side=tk.TOP, pady=10, padx=5)
+        
+        # Create collapsible menu panel
+        self.create_menu_panel()
+        
+        # Create chat area
+        self.create_chat_area()
+    
+    def create_menu_panel(self):
+        self.menu_panel = tk.Frame(self.main_container, bg="#272727", width=200)
+        
+        # Add settings title
+        tk.Label(
+            self.menu_panel, text="SETTINGS", bg="#272727", fg="#FFFFFF",
+            font=("Arial", 14, "bold"), padx=10, pady=10
+        ).pack(fill=tk.X)
+        
+        # Add separator
+        tk.Frame(self.menu_panel, height=2, bg="#444444").pack(fill=tk.X, padx=10)
+        
+        # Define button styles and create buttons
+        button_configs = {
+            "Change Username": ("#4CAF50", "#FFFFFF", self.change_username),
+            "Change Color": ("#2196F3", "#FFFFFF", self.change_color),
+            "Chatrooms": ("#FF9800", "#FFFFFF", self.show_chatrooms_manager),  # Changed from "Change Chatroom"
+            "Add User": ("#9C27B0", "#FFFFFF", self.add_user),
+            "Chat Rules": ("#607D8B", "#FFFFFF", self.show_rules_editor),
+            "Diagnostics": ("#795548", "#FFFFFF", self.show_diagnostics)
+        }
+        
+        for text, (bg, fg, cmd) in button_configs.items():
+            self.create_settings_button(text, cmd, (bg, fg))
+        
+        # Add separator
+        tk.Frame(self.menu_panel, height=2, bg="#444444").pack(fill=tk.X, padx=10, pady=10)
+        
+        # Add exit button
+        tk.Button(
+            self.menu_panel, text="Exit Chat", command=self.on_closing,
+            bg="#FF4444", fg="#FFFFFF", font=self.button_font,
+            relief=tk.FLAT, padx=10, pady=8
+        ).pack(fill=tk.X, padx=10, pady=10, side=tk.BOTTOM)
+    
+    def load_user_chatrooms(self):
+        """Load user's chatroom history from JSON file"""
+        try:
+            if os.path.exists(CHATROOMS_FILE):
+                with open(CHATROOMS_FILE, 'r') as f:
+                    try:
+                        chatrooms_data = json.load(f)
+                        if self.username in chatrooms_data:
+                            return chatrooms_data[self.username]
+                    except json.JSONDecodeError:
+                        # Handle case of empty or invalid JSON file
+                        pass
+        except Exception as e:
+            print(f"Error loading chatrooms: {e}")
+            # If JSON fails, try the legacy pickle format as fallback
+            try:
+                old_file = os.path.join(os.path.expanduser("~"), ".jack_chat_rooms.pkl")
+                if os.path.exists(old_file):
+                    with open(old_file, 'rb') as f:
+                        chatrooms_data = pickle.load(f)
+                        if self.username in chatrooms_data:
+                            return chatrooms_data[self.username]
+            except:
+                pass
+        
+        return []  # Default to empty list if no history or error
+    
+    def save_user_chatrooms(self):
+        """Save user's chatroom history to JSON file"""
+        try:
+            chatrooms_data = {}
+            if os.path.exists(CHATROOMS_FILE):
+                with open(CHATROOMS_FILE, 'r') as f:
+                    try:
+                        chatrooms_data = json.load(f)
+                    except json.JSONDecodeError:
+                        # Handle case of empty or invalid JSON file
+                        pass
+            
+            chatrooms_data[self.username] = self.user_chatrooms
+            
+            with open(CHATROOMS_FILE, 'w') as f:
+                json.dump(chatrooms_data, f, indent=4)
+        except Exception as e:
+            print(f"Error saving chatrooms: {e}")
+    
+    def load_rules(self):
+        """Load the user's highlight/mute/hide rules and compile them"""
+        try:
+            if os.path.exists(RULES_FILE):
+                with open(RULES_FILE, 'r') as f:
+                    user_rules = json.load(f).get(self.username, {})
+                return ChatRules(self.username, user_rules.get("keywords", ()),
+                                 user_rules.get("muted", ()), user_rules.get("hide", ()))
+        except Exception as e:
+            print(f"Error loading rules: {e}")
+        return ChatRules(self.username)
+    
+    def save_rules(self):
+        """Save the user's rules next to the chatrooms file"""
+        try:
+            rules_data = {}
+            if os.path.exists(RULES_FILE):
+                with open(RULES_FILE, 'r') as f:
+                    try:
+                        rules_data = json.load(f)
+                    except json.JSONDecodeError:
+                        pass
+            
+            rules_data[self.username] = self.rules.to_dict()
+            
+            with open(RULES_FILE, 'w') as f:
+                json.dump(rules_data, f, indent=4)
+        except Exception as e:
+            print(f"Error saving rules: {e}")
+    
+    def show_rules_editor(self):
+        """Edit highlight keywords, muted users and hide patterns, one per line"""
+        if self.menu_visible:
+            self.toggle_menu()
+        
+        rules_window = tk.Toplevel(self.master)
+        rules_window.title("Chat Rules")
+        rules_window.geometry("420x520")
+        rules_window.configure(bg="#1E1E1E")
+        
+        sections = [
+            ("Highlight keywords (your name is always highlighted):", self.rules.keywords),
+            ("Muted users:", self.rules.muted),
+            ("Hide messages containing (prefix with re: for a regex):", self.rules.hide)
+        ]
+        boxes = []
+        for title, values in sections:
+            tk.Label(
+                rules_window, text=title, bg="#1E1E1E", fg="#FFFFFF", anchor="w"
+            ).pack(fill=tk.X, padx=10, pady=(10, 2))
+            box = tk.Text(rules_window, height=6, bg="#333333", fg="#FFFFFF", insertbackground="white")
+            box.insert("1.0", "\n".join(values))
+            box.pack(fill=tk.X, padx=10)
+            boxes.append(box)
+        
+        def save_and_close():
+            keywords, muted, hide = (
+                [line.strip() for line in box.get("1.0", tk.END).splitlines() if line.strip()]
+                for box in boxes
+            )
+            # Rebuild once; on_message picks up the new object atomically
+            self.rules = ChatRules(self.username, keywords, muted, hide)
+            self.save_rules()
+            rules_window.destroy()
+        
+        tk.Button(
+            rules_window, text="Save", bg="#4CAF50", fg="#FFFFFF", command=save_and_close
+        ).pack(side=tk.LEFT, padx=10, pady=10)
+        tk.Button(
+            rules_window, text="Cancel", bg="#555555", fg="#FFFFFF", command=rules_window.destroy
+        ).pack(side=tk.RIGHT, padx=10, pady=10)
+    
+    def show_diagnostics(self):
+        """Start a bounded profiling / memory capture without restarting"""
+        if self.menu_visible:
+            self.toggle_menu()
+        
+        window = tk.Toplevel(self.master)
+        window.title("Diagnostics")
+        window.geometry("360x260")
+        window.configure(bg="#1E1E1E")
+        
+        options = {
+            "cprofile": tk.BooleanVar(value=True),
+            "sampling": tk.BooleanVar(value=True),
+            "memory": tk.BooleanVar(value=False)
+        }
+        labels = {
+            "cprofile": "cProfile (Tk thread and message callbacks)",
+            "sampling": "Sampling profiler (all threads)",
+            "memory": "Trace memory allocations (tracemalloc)"
+        }
+        for key, var in options.items():
+            tk.Checkbutton(
+                window, text=labels[key], variable=var, bg="#1E1E1E", fg="#FFFFFF",
+                selectcolor="#333333", activebackground="#1E1E1E", anchor="w"
+            ).pack(fill=tk.X, padx=10, pady=2)
+        
+        seconds_var = tk.IntVar(value=CAPTURE_SECONDS)
+        tk.Label(window, text="Capture seconds:", bg="#1E1E1E", fg="#FFFFFF").pack(pady=(10, 0))
+        tk.Spinbox(window, from_=5, to=600, textvariable=seconds_var, width=6).pack()
+        
+        def done(path):
+            self.set_status(self.status_text)
+            if path:
+                messagebox.showinfo("Diagnostics", f"Capture written to:\n{path}")
+        
+        def start():
+            started = self.diagnostics.start(
+                seconds=max(1, seconds_var.get()), on_done=done,
+                **{key: var.get() for key, var in options.items()}
+            )
+            if started:
+                self.set_status(self.status_text)
+                window.destroy()
+            elif self.diagnostics.active:
+                messagebox.showinfo("Diagnostics", "A capture is already running.", parent=window)
+        
+        tk.Button(window, text="Start", bg="#4CAF50", fg="#FFFFFF", command=start).pack(side=tk.LEFT, padx=10, pady=10)
+        tk.Button(window, text="Close", bg="#555555", fg="#FFFFFF", command=window.destroy).pack(side=tk.RIGHT, padx=10, pady=10)
+    
+    def load_room_activity(self):
+        """Load last-activity times (epoch seconds) for the user's chatrooms"""
+        try:
+            if os.path.exists(ROOM_ACTIVITY_FILE):
+                with open(ROOM_ACTIVITY_FILE, 'r') as f:
+                    return json.load(f).get(self.username, {})
+        except Exception as e:
+            print(f"Error loading room activity: {e}")
+        return {}
+    
+    def save_room_activity(self):
+        """Save last-activity times to JSON file"""
+        try:
+            activity_data = {}
+            if os.path.exists(ROOM_ACTIVITY_FILE):
+                with open(ROOM_ACTIVITY_FILE, 'r') as f:
+                    try:
+                        activity_data = json.load(f)
+                    except json.JSONDecodeError:
+                        pass
+            
+            activity_data[self.username] = self.room_activity
+            
+            with open(ROOM_ACTIVITY_FILE, 'w') as f:
+                json.dump(activity_data, f)
+        except Exception as e:
+            print(f"Error saving room activity: {e}")
+    
+    def touch_room(self, chatroom):
+        """Record activity in a chatroom (kept in memory, saved on room change and exit)"""
+        self.room_activity[chatroom] = time.time()
+    
+    def add_chatroom_to_history(self, chatroom):
+        """Add a chatroom to user's history if not already present"""
+        self.touch_room(chatroom)
+        if chatroom not in self.user_chatrooms:
+            self.user_chatrooms.append(chatroom)
+            self.save_user_chatrooms()
+    
+    def remove_chatroom_from_history(self, chatroom):
+        """Remove a chatroom from user's history"""
+        if chatroom in self.user_chatrooms:
+            self.user_chatrooms.remove(chatroom)
+            self.save_user_chatrooms()
+    
+    def show_chatrooms_manager(self):
+        """Open the chatrooms manager window"""
+        # Close the menu panel to avoid cluttering the UI
+        if self.menu_visible:
+            self.toggle_menu()
+        
+        # Create chatroom manager window
+        chatrooms_window = tk.Toplevel(self.master)
+        chatrooms_window.title("Manage Chatrooms")
+        chatrooms_window.geometry("500x400")
+        chatrooms_window.configure(bg="#1E1E1E")
+        
+        # Create frame for the content
+        content_frame = tk.Frame(chatrooms_window, bg="#1E1E1E")
+        content_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
+        
+        # Add title label
+        tk.Label(
+            content_frame, 
+            text="Your Chatrooms", 
+            font=("Arial", 14, "bold"),
+            bg="#1E1E1E", 
+            fg="#FFFFFF"
+        ).pack(pady=(0, 10))
+        
+        # Current chatroom indicator
+        tk.Label(
+            content_frame,
+            text=f"You are currently in: {self.chatroom}",
+            font=("Arial", 11, "italic"),
+            bg="#1E1E1E",
+            fg="#AAAAAA"
+        ).pack(pady=(0, 10))
+        
+        # Type-to-filter box
+        filter_var = tk.StringVar()
+        tk.Entry(
+            content_frame, textvariable=filter_var, bg="#333333", fg="#FFFFFF",
+            insertbackground="white", font=("Arial", 11)
+        ).pack(fill=tk.X)
+        
+        # Virtualized list: only visible rows exist as widgets, most recent first
+        rooms = sorted(self.user_chatrooms, key=lambda r: self.room_activity.get(r, 0), reverse=True)
+        index = RoomIndex(rooms)
+        room_list = VirtualRoomList(
+            content_frame, self.chatroom,
+            on_join=lambda r: self.join_chatroom(r, chatrooms_window),
+            on_remove=lambda r: self.confirm_remove_chatroom(r, chatrooms_window)
+        )
+        room_list.pack(fill=tk.BOTH, expand=True, pady=10)
+        room_list.set_items(rooms)
+        filter_var.trace_add("write", lambda *args: room_list.set_items(index.search(filter_var.get())))
+        
+        # Add buttons for new chatroom
+        buttons_frame = tk.Frame(content_frame, bg="#1E1E1E")
+        buttons_frame.pack(fill=tk.X, pady=15)
+        
+        # New chatroom button
+        tk.Button(
+            buttons_frame,
+            text="Add New Chatroom",
+            bg="#4CAF50",
+            fg="#FFFFFF",
+            command=lambda: self.add_new_chatroom(chatrooms_window)
+        ).pack(side=tk.LEFT, padx=5)
+        
+        # Close button
+        tk.Button(
+            buttons_frame,
+            text="Close",
+            bg="#555555",
+            fg="#FFFFFF",
+            command=chatrooms_window.destroy
+        ).pack(side=tk.RIGHT, padx=5)
+    
+    def join_chatroom(self, chatroom, window):
+        """Join an existing chatroom from the manager"""
+        if chatroom == self.chatroom:
+            return  # Already in this room
+            
+        # Change to the selected chatroom
+        self.change_to_chatroom(chatroom)
+        window.destroy()  # Close the chatrooms manager
+    
+    def add_new_chatroom(self, parent_window):
+        """Add a new chatroom"""
+        new_room = simpledialog.askstring("New Chatroom", 
+                                         "Enter name for the new chatroom:", 
+                                         parent=parent_window)
+        
+        if not new_room or not new_room.strip():
+            return
+            
+        # Add to history
+        self.add_chatroom_to_history(new_room)
+        
+        # Ask if user wants to join the new room
+        if messagebox.askyesno("Join Room", 
+                              f"Chatroom '{new_room}' has been added to your list.\nWould you like to join it now?",
+                              parent=parent_window):
+            self.change_to_chatroom(new_room)
+            parent_window.destroy()  # Close the chatrooms manager
+        else:
+            # Just refresh the chatrooms manager
+            parent_window.destroy()
+            self.show_chatrooms_manager()
+    
+    def confirm_remove_chatroom(self, chatroom, parent_window):
+        """Confirm before removing a chatroom"""
+        if chatroom == self.chatroom:
+            messagebox.showinfo("Cannot Remove", 
+                              "You cannot remove the chatroom you're currently in.",
+                              parent=parent_window)
+            return
+            
+        if messagebox.askyesno("Confirm Removal", 
+                              f"Are you sure you want to remove '{chatroom}' from your list?",
+                              parent=parent_window):
+            self.remove_chatroom_from_history(chatroom)
+            # Refresh the chatrooms manager
+            parent_window.destroy()
+            self.show_chatrooms_manager()
+    
+    def create_chat_area(self):
+        # Chat display area
+        self.chat_frame = tk.Frame(self.left_frame, bg="#1E1E1E")
+        self.chat_frame.pack(fill=tk.BOTH, expand=True)
+        
+        # Chat history display with scrollbar
+        self.chat_display = scrolledtext.ScrolledText(
+            self.chat_frame, wrap=tk.WORD, bg="#121212", fg="#FFFFFF",
+            height=20, insertbackground="white", font=self.message_font
+        )
+        self.chat_display.pack(fill=tk.BOTH, expand=True)
+        self.view = ChatView(
+            self.master, self.chat_display, self.lanes,
+            fonts={"timestamp": self.timestamp_font, "username": self.username_font,
+                   "message": self.message_font, "deleted": self.deleted_font},
+            colors={"jack": "#FF0000", "bob": "#008000"}
+        )
+        self.view.listener = self.message_rendered
+        self.view.on_mode_change = lambda: self.set_status(self.status_text)
+        self.view.configure_tags()
+        self.chat_display.config(state=tk.DISABLED)
+        
+        # "Seen by N" for the latest message
+        self.receipt_var = tk.StringVar()
+        tk.Label(
+            self.chat_frame, textvariable=self.receipt_var, anchor=tk.E,
+            bg="#1E1E1E", fg="#777777", font=("Arial", 9)
+        ).pack(fill=tk.X)
+        
+        # Read receipt state
+        self.receipts = ReadReceipts()
+        self.receipt_sent = None
+        self.receipt_sent_at = 0
+        self.master.after(RECEIPT_REFRESH_MS, self.refresh_receipts)
+        
+        # Status bar
+        self.status_var = tk.StringVar()
+        self.status_text = ""
+        self.set_status(f"Connected as {self.username} in {self.chatroom}")
+        self.status_bar = tk.Label(
+            self.left_frame, textvariable=self.status_var, bd=1, relief=tk.SUNKEN,
+            anchor=tk.W, bg="#333333", fg="#AAAAAA"
+        )
+        self.status_bar.pack(side=tk.BOTTOM, fill=tk.X)
+        
+        # Message input area
+        self.input_frame = tk.Frame(self.left_frame, bg="#1E1E1E")
+        self.input_frame.pack(fill=tk.X, pady=10)
+        
+        self.message_entry = tk.Entry(
+            self.input_frame, bg="#333333", fg="#FFFFFF",
+            insertbackground="white", font=("Arial", 11)
+        )
+        self.message_entry.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.message_entry.bind("<Return>", self.send_message)
+        self.message_entry.bind("<KeyRelease>", self.on_typing)
+        
+        # Typing indicator state
+        self.typing_tracker = TypingTracker()
+        self.typing_sent_at = 0
+        self.typing_stop_job = None
+        self.master.after(TYPING_REFRESH_MS, self.refresh_typing_status)
+        
+        self.send_button = tk.Button(
+            self.input_frame, text="Send", command=self.send_message,
+            bg="#444444", fg="#FFFFFF", activebackground="#666666"
+        )
+        self.send_button.pack(side=tk.RIGHT, padx=5)
+    
+    def toggle_menu(self):
+        if self.menu_visible:
+            self.menu_panel.pack_forget()
+            self.menu_visible = False
+        else:
+            self.menu_panel.pack(side=tk.RIGHT, fill=tk.Y, before=self.right_panel)
+            self.menu_visible = True
+    
+    def create_settings_button(self, text, command, colors):
+        bg_color, fg_color = colors
+        button = tk.Button(
+            self.menu_panel, text=text, command=command, bg=bg_color, fg=fg_color,
+            activebackground=self.lighten_color(bg_color), activeforeground=fg_color,
+            font=self.button_font, relief=tk.FLAT, padx=10, pady=8, anchor="w", width=16
+        )
+        button.pack(fill=tk.X, padx=10, pady=5)
+        
+        # Add hover effect
+        button.bind("<Enter>", lambda e, b=button, c=bg_color: b.config(bg=self.lighten_color(c)))
+        button.bind("<Leave>", lambda e, b=button, c=bg_color: b.config(bg=c))
+        
+        return button
+    
+    def lighten_color(self, hex_color):
+        hex_color = hex_color.lstrip('#')
+        r, g, b = tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
+        r, g, b = [min(255, int(c * 1.2)) for c in (r, g, b)]
+        return f"#{r:02x}{g:02x}{b:02x}"
+    
+    def publish(self, topic, payload, expiry=None, metadata=None):
+        """Publish a JSON payload; under MQTT v5 metadata travels as user properties"""
+        if not self.mqtt_v5:
+            if metadata:
+                payload = {**payload, **metadata}
+            return self.client.publish(topic, json.dumps(payload))
+        
+        props = Properties(PacketTypes.PUBLISH)
+        if expiry:
+            props.MessageExpiryInterval = expiry
+        for key, value in (metadata or {}).items():
+            props.UserProperty = (key, str(value))
+        
+        # Send the full topic once, then only its alias for the rest of the connection
+        with self.alias_lock:
+            alias = self.topic_aliases.get(topic)
+            if alias is not None:
+                props.TopicAlias = alias
+                topic = ""
+            elif len(self.topic_aliases) < self.topic_alias_max:
+                alias = len(self.topic_aliases) + 1
+                self.topic_aliases[topic] = alias
+                props.TopicAlias = alias
+        
+        return self.client.publish(topic, json.dumps(payload), properties=props)
+    
+    def subscription_topic(self, topic):
+        """Subscribe through the worker's shared group, if it has one"""
+        if self.share_group:
+            return f"$share/{self.share_group}/{topic}"
+        return topic
+    
+    def send_system_message(self, message):
+        """Utility function to send system messages"""
+        self.publish(self.chat_topic, system_payload(message), expiry=CHAT_MESSAGE_EXPIRY)
+    
+    def add_user(self):
+        user_to_add = simpledialog.askstring("Add User", 
+                                           "Enter the username of the person you want to invite:", 
+                                           parent=self.master)
+        if user_to_add and user_to_add.strip():
+            # Create and send invitation
+            timestamp = datetime.now().strftime("%H:%M:%S - %d/%m/%Y")
+            
+            # System notification to chatroom
+            self.send_system_message(f"{self.username} has invited {user_to_add} to join this chatroom")
+            
+            # Private invitation data
+            personal_invite = {
+                "type": "invitation",
+                "from": self.username,
+                "chatroom": self.chatroom,
+                "timestamp": timestamp
+            }
+            
+            # Send and store invitation
+            private_topic = f"{BASE_TOPIC}/invites/{user_to_add}"
+            self.publish(private_topic, personal_invite, expiry=INVITATION_EXPIRY)
+            self.store_invitation(user_to_add, personal_invite)
+            
+            messagebox.showinfo("Invitation Sent", f"An invitation has been sent to {user_to_add}.")
+    
+    def change_username(self):
+        new_username = simpledialog.askstring("Change Username", 
+                                             f"Current username: {self.username}\nEnter new username:", 
+                                             parent=self.master)
+        if new_username and new_username.strip():
+            # Notify about name change
+            self.send_system_message(f"{self.username} has changed their name to {new_username}")
+            
+            # Update MQTT subscriptions
+            self.client.unsubscribe(self.personal_topic)
+            self.username = new_username
+            self.rules = self.load_rules()
+            self.client.user_data_set({"username": self.username, "chatroom": self.chatroom})
+            self.personal_topic = f"{BASE_TOPIC}/invites/{self.username}"
+            self.client.subscribe(self.personal_topic)
+            
+            # Update UI
+            self.set_status(f"Connected as {self.username} in {self.chatroom}")
+    
+    def change_to_chatroom(self, new_chatroom, via_invitation=False):
+        # Leave current chatroom
+        self.stop_typing()
+        self.send_system_message(f"{self.username} has left the chat")
+        self.client.unsubscribe(self.subscription_topic(self.chat_topic))
+        self.client.unsubscribe(self.typing_topic)
+        self.client.unsubscribe(self.receipt_topic)
+        
+        # Join new chatroom
+        self.chatroom = new_chatroom
+        self.room_visit += 1
+        self.client.user_data_set({"username": self.username, "chatroom": self.chatroom})
+        self.chat_topic = room_topic(self.chatroom)
+        self.typing_topic = f"{self.chat_topic}/typing"
+        self.receipt_topic = f"{self.chat_topic}/receipts"
+        self.client.subscribe(self.subscription_topic(self.chat_topic))
+        self.client.subscribe(self.typing_topic)
+        self.client.subscribe(self.receipt_topic)
+        self.typing_tracker.clear()
+        self.receipts = ReadReceipts()
+        self.receipt_var.set("")
+        
+        # Add to chatroom history
+        self.add_chatroom_to_history(new_chatroom)
+        
+        self.save_room_activity()
+        
+        # Send join notification, on the new room's broker if rooms agree on one
+        join_msg = f"{self.username} has joined the chat"
+        if via_invitation:
+            join_msg += " in response to an invitation"
+        target = None
+        if TRANSPORT == "tcp" and BROKER_SELECTION == "room":
+            target = choose_broker(self.chatroom, MQTT_BROKERS, self.broker_probes)
+        if target is not None and target != self.broker and self.migration is None:
+            self.migrate_to_broker(target, announcement=join_msg)
+        else:
+            self.send_system_message(join_msg)
+        
+        # Update UI
+        self.set_status(f"Connected as {self.username} in {self.chatroom}")
+        
+        # Clear chat display
+        self.view.clear()
+        self.my_message_ids = []
+        join_text = f"--- You have joined {self.chatroom}"
+        if via_invitation:
+            join_text += " via invitation"
+        self.paint_history(self.chatroom)
+        self.view.append_system(join_text + " ---")
+    
+    def change_color(self):
+        color_window = tk.Toplevel(self.master)
+        color_window.title("Select Your Color")
+        color_window.geometry("300x200")
+        color_window.configure(bg="#1E1E1E")
+        
+        # Add color selection interface
+        colors = {
+            "Red": "#FF6B6B", "Green": "#4AFF65", "Blue": "#63B8FF",
+            "Yellow": "#FFF07C", "Magenta": "#FF5DC8", "Cyan": "#00FFFF"
+        }
+        
+        tk.Label(
+            color_window, text="Choose your username color:", 
+            bg="#1E1E1E", fg="#FFFFFF", font=("Arial", 12)
+        ).pack(pady=10)
+        
+        button_frame = tk.Frame(color_window, bg="#1E1E1E")
+        button_frame.pack(pady=10)
+        
+        for i, (color_name, color_code) in enumerate(colors.items()):
+            btn = tk.Button(
+                button_frame, text=color_name, bg=color_code,
+                fg="#000000" if color_name in ["Yellow", "Cyan", "Green"] else "#FFFFFF",
+                width=8, command=lambda c=color_code, n=color_name.lower(): self.set_color(c, n, color_window)
+            )
+            row, col = divmod(i, 3)
+            btn.grid(row=row, column=col, padx=5, pady=5)
+        
+        tk.Button(
+            color_window, text="Custom Color", command=lambda: self.pick_custom_color(color_window),
+            bg="#444444", fg="#FFFFFF"
+        ).pack(pady=10)
+    
+    def pick_custom_color(self, window):
+        color_code = colorchooser.askcolor(title="Choose a color")
+        if color_code and color_code[1]:
+            self.set_color(color_code[1], "custom", window)
+    
+    def set_color(self, color_code, color_name, window):
+        self.my_color = color_code
+        self.my_color_name = color_name
+        
+        self.send_system_message(f"{self.username} has changed their color to {color_name}")
+        
+        self.view.set_color(self.username, color_code)
+        
+        window.destroy()
+    
+    def connect_to_mqtt(self, announce=True):
+        try:
+            host, port = self.broker if TRANSPORT == "tcp" else broker_address(TRANSPORT)
+            self.client.connect(host, port, 60)
+            self.start_session(announce)
+        except Exception as e:
+            if self.mqtt_v5:
+                self.fallback_to_mqtt311()
+                return
+            if self.fail_over():
+                return
+            messagebox.showerror("Connection Error", f"Failed to connect: {str(e)}")
+            self.master.destroy()
+    
+    def start_session(self, announce=True):
+        """Run the network loop of a freshly connected client and subscribe to our topics"""
+        threading.Thread(target=self.client.loop_forever, daemon=True).start()
+        self.client.subscribe(self.subscription_topic(self.chat_topic))
+        self.client.subscribe(self.personal_topic)
+        self.client.subscribe(self.typing_topic)
+        self.client.subscribe(self.receipt_topic)
+        
+        # Send join notification
+        if announce:
+            self.send_system_message(f"{self.username} has joined the chat")
+    
+    def fallback_to_mqtt311(self):
+        """Reconnect with MQTT 3.1.1 after a broker refused the v5 handshake"""
+        try:
+            self.client.disconnect()
+        except:
+            pass
+        self.mqtt_v5 = False
+        self.setup_mqtt_client()
+        self.connect_to_mqtt()
+    
+    def start_broker_probing(self):
+        """Probe the broker list in the background; never delays the first connect"""
+        if TRANSPORT == "tcp" and len(MQTT_BROKERS) > 1:
+            self.prober = BrokerProber(
+                MQTT_BROKERS, lambda results: self.master.after(0, self.on_probe_results, results)
+            )
+            self.prober.start()
+    
+    def on_probe_results(self, results):
+        self.broker_probes = results
+        self.failed_brokers = {b for b, r in results.items() if not r["healthy"]}
+        target = choose_broker(self.chatroom, MQTT_BROKERS, results)
+        if target is None or target == self.broker:
+            return
+        
+        current = results.get(self.broker, {})
+        if BROKER_SELECTION == "fastest" and current.get("healthy"):
+            # Only move for a clear win, so small jitter doesn't bounce us around
+            if results[target]["rtt"] > current["rtt"] * (1 - MIGRATE_MARGIN):
+                return
+        self.migrate_to_broker(target)
+    
+    def migrate_to_broker(self, broker, announcement=None):
+        """Move this session to another broker, keeping the current room.
+        
+        The new connection is made in the background; the current one is only
+        dropped once it succeeds, so a failed move leaves the session as it was.
+        An announcement is sent once we know which broker the room is on.
+        """
+        if self.migration is not None:
+            return
+        client = self.create_client()
+        
+        def connect():
+            try:
+                client.connect(broker[0], broker[1], 60)
+            except Exception as e:
+                self.master.after(0, self.migration_failed, broker, e, announcement)
+                return
+            self.master.after(0, self.finish_migration, broker, client, announcement)
+        
+        self.migration = threading.Thread(target=connect, daemon=True)
+        self.migration.start()
+    
+    def finish_migration(self, broker, client, announcement=None):
+        self.migration = None
+        try:
+            self.client.disconnect()
+        except:
+            pass
+        self.client = client
+        self.broker = broker
+        with self.alias_lock:
+            self.topic_aliases = {}
+            self.topic_alias_max = 0
+        self.start_session(announce=False)
+        if announcement:
+            self.send_system_message(announcement)
+        self.set_status(f"Moved to {broker[0]}:{broker[1]} as {self.username} in {self.chatroom}")
+    
+    def migration_failed(self, broker, error, announcement=None):
+        """Stay where we are and skip that broker until the next probe says otherwise"""
+        self.migration = None
+        print(f"Could not move to {broker[0]}:{broker[1]}: {error}")
+        self.failed_brokers.add(broker)
+        self.broker_probes = dict(self.broker_probes)
+        self.broker_probes[broker] = {"healthy": False, "connect": None, "rtt": None}
+        if announcement:
+            self.send_system_message(announcement)
+    
+    def fail_over(self):
+        """After a failed connect, try the next broker for this room; False when none is left"""
+        if TRANSPORT != "tcp":
+            return False
+        self.failed_brokers.add(self.broker)
+        target = choose_broker(self.chatroom, MQTT_BROKERS, self.broker_probes, exclude=self.failed_brokers)
+        if target is None:
+            return False
+        self.broker = target
+        self.setup_mqtt_client()
+        self.connect_to_mqtt()
+        return True
+    
+    def on_connect(self, client, userdata, flags, rc, properties=None):
+        code = getattr(rc, "value", rc)
+        if self.mqtt_v5 and code in (1, 132):  # Unacceptable / unsupported protocol version
+            self.master.after(0, self.fallback_to_mqtt311)
+            return
+        
+        if self.mqtt_v5:
+            # Aliases are per connection; start over with the broker's new limit
+            with self.alias_lock:
+                self.topic_aliases = {}
+                self.topic_alias_max = getattr(properties, "TopicAliasMaximum", 0)
+        
+        status = "Connected" if code == 0 else f"Connection failed, code: {rc}"
+        protocol = " (MQTT v5)" if self.mqtt_v5 else ""
+        self.lanes.post("system", self.set_status, f"{status}{protocol} as {self.username} in {self.chatroom}")
+    
+    def on_message(self, client, userdata, msg):
+        if self.capture is not None:
+            self.capture.record(msg.topic, msg.payload)
+        profiler = self.diagnostics.network_profiler
+        if profiler is not None:
+            try:
+                profiler.runcall(self.process_message, client, userdata, msg)
+                return
+            except ValueError:
+                # Profiler hook taken (e.g. by a debugger); never let it kill the network thread
+                self.diagnostics.network_profiler = None
+        self.process_message(client, userdata, msg)
+    
+    def process_message(self, client, userdata, msg):
+        # The room this message arrived in; lanes may still hold it after a room switch
+        visit, room = self.room_visit, self.chatroom
+        try:
+            payload = decode_payload(msg)
+            
+            # MQTT v5 metadata carried outside the JSON body
+            user_properties = getattr(getattr(msg, "properties", None), "UserProperty", None)
+            if user_properties:
+                for key, value in user_properties:
+                    payload.setdefault(key, value)
+            
+            # Typing signals never touch the chat display
+            if msg.topic == self.typing_topic:
+                username = payload.get("username")
+                if username and username != self.username:
+                    self.typing_tracker.update(username, bool(payload.get("typing")))
+                return
+            
+            # Read receipts only update the per-room array (chat lane: they refer to rendered messages)
+            if msg.topic == self.receipt_topic:
+                username = payload.get("username")
+                if username and username != self.username:
+                    self.lanes.post("chat", self.apply_receipt, visit, username, payload.get("last"))
+                return
+            
+            # Handle personal invitations (control lane, ahead of any chat backlog)
+            if msg.topic == self.personal_topic and payload.get("type") == "invitation":
+                self.lanes.post("control", self.handle_personal_invitation, payload)
+                return
+            
+            # Edits and retractions patch an already rendered message in place, so they queue behind it
+            if payload.get("type") in ("edit", "delete"):
+                self.lanes.post("chat", self.apply_message_change, visit, payload.get("type"),
+                                payload.get("id"), payload.get("username"), payload.get("message", ""))
+                return
+            
+            # Regular chat messages
+            timestamp, username, message = chat_fields(payload)
+            
+            # Handle invitation within chat message
+            if "invitation" in payload and payload["invitation"].get("to") == self.username:
+                invite = payload["invitation"]
+                self.lanes.post("control", self.show_invitation_notification,
+                                payload.get("username", "Someone"), invite.get("chatroom", "unknown"))
+            
+            # Mute/hide rules and highlight spans, evaluated once per message
+            highlights = ()
+            if username != "System":
+                highlights = self.rules.evaluate(username, message)
+                if highlights is None:
+                    return
+            
+            if msg.topic == self.chat_topic:
+                self.room_activity[room] = time.time()
+            
+            # Update chat display; join/leave lines keep their place among the chat
+            self.lanes.post("chat", self.render_message, visit, room, timestamp, username, message,
+                            payload.get("id"), highlights)
+            
+        except Exception as e:
+            print(f"Error processing message: {e}")
+    
+    def render_message(self, visit, room, timestamp, username, message, message_id=None, highlights=()):
+        """Store a message under its room and display it if that room is still open (Tk thread, via the lanes)"""
+        if self.history is not None:
+            self.history.add(room, timestamp, username, message, message_id)
+        if visit == self.room_visit:
+            self.view.render(timestamp, username, message, message_id, highlights)
+    
+    def get_tag_for_username(self, username):
+        """Get the appropriate tag for a username"""
+        return self.view.tag_for(username)
+    
+    def check_pending_invitations(self):
+        try:
+            if not os.path.exists(INVITATIONS_FILE):
+                return
+                
+            with open(INVITATIONS_FILE, 'r') as f:
+                try:
+                    stored_invitations = json.load(f)
+                except json.JSONDecodeError:
+                    return
+            
+            if self.username not in stored_invitations or not stored_invitations[self.username]:
+                return
+                
+            user_invites = stored_invitations[self.username]
+            self.show_invitation_window(user_invites, stored_invitations)
+                
+        except Exception as e:
+            print(f"Error loading stored invitations: {e}")
+            # Try legacy format as fallback
+            try:
+                old_file = os.path.join(os.path.expanduser("~"), ".jack_chat_invitations.pkl")
+                if os.path.exists(old_file):
+                    with open(old_file, 'rb') as f:
+                        stored_invitations = pickle.load(f)
+                    
+                    if self.username in stored_invitations and stored_invitations[self.username]:
+                        user_invites = stored_invitations[self.username]
+                        self.show_invitation_window(user_invites, stored_invitations)
+                        # Convert to JSON for future use
+                        with open(INVITATIONS_FILE, 'w') as f:
+                            json.dump(stored_invitations, f, indent=4)
+            except:
+                pass
+    
+    def show_invitation_window(self, user_invites, stored_invitations):
+        invite_window = tk.Toplevel(self.master)
+        invite_window.title("Pending Chat Invitations")
+        invite_window.geometry("400x300")
+        invite_window.configure(bg="#1E1E1E")
+        
+        tk.Label(
+            invite_window, text="You have pending invitations:",
+            bg="#1E1E1E", fg="#FFFFFF", font=("Arial", 12, "bold")
+        ).pack(pady=10)
+        
+        invites_frame = tk.Frame(invite_window, bg="#1E1E1E")
+        invites_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
+        
+        processed_invites = []
+        
+        for i, invite in enumerate(user_invites):
+            # Create invite display panel
+            self.create_invitation_panel(invites_frame, invite, processed_invites, i)
+        
+        # Add close button
+        def close_and_save():
+            new_invites = [invite for i, invite in enumerate(user_invites) if i not in processed_invites]
+            stored_invitations[self.username] = new_invites
+            with open(INVITATIONS_FILE, 'w') as f:
+                json.dump(stored_invitations, f, indent=4)
+            invite_window.destroy()
+        
+        tk.Button(
+            invite_window, text="Close", bg="#555555", fg="#FFFFFF", command=close_and_save
+        ).pack(pady=10)
+        
+        invite_window.protocol("WM_DELETE_WINDOW", close_and_save)
+    
+    def create_invitation_panel(self, parent, invite, processed_invites, idx):
+        invite_frame = tk.Frame(parent, bg="#2A2A2A", padx=10, pady=10)
+        invite_frame.pack(fill=tk.X, pady=5)
+        
+        from_user = invite.get("from", "Someone")
+        chatroom = invite.get("chatroom", "unknown")
+        timestamp = invite.get("timestamp", "")
+        
+        tk.Label(
+            invite_frame, text=f"From {from_user} to join '{chatroom}'\nSent: {timestamp}",
+            bg="#2A2A2A", fg="#FFFFFF", justify=tk.LEFT, anchor="w"
+        ).pack(fill=tk.X, pady=5)
+        
+        buttons_frame = tk.Frame(invite_frame, bg="#2A2A2A")
+        buttons_frame.pack(fill=tk.X)
+        
+        tk.Button(
+            buttons_frame, text="Accept", bg="#4CAF50", fg="#FFFFFF",
+            command=lambda room=chatroom, i=idx: self.accept_stored_invitation(room, processed_invites, i)
+        ).pack(side=tk.LEFT, padx=5)
+        
+        tk.Button(
+            buttons_frame, text="Decline", bg="#F44336", fg="#FFFFFF",
+            command=lambda i=idx: self.decline_stored_invitation(processed_invites, i)
+        ).pack(side=tk.LEFT, padx=5)
+    
+    def accept_stored_invitation(self, chatroom, processed_invites, idx):
+        processed_invites.append(idx)
+        self.change_to_chatroom(chatroom, True)
+    
+    def decline_stored_invitation(self, processed_invites, idx):
+        processed_invites.append(idx)
+    
+    def handle_personal_invitation(self, invite):
+        from_user = invite.get("from", "Someone")
+        chatroom = invite.get("chatroom", "unknown")
+        self.show_invitation_notification(from_user, chatroom, stored=True)
+    
+    def show_invitation_notification(self, from_user, chatroom, stored=False):
+        """Non-modal invitation popup in the corner of the main window"""
+        note = tk.Toplevel(self.master, bg="#2A2A2A", padx=10, pady=10)
+        note.title("Chat Invitation")
+        note.transient(self.master)
+        note.resizable(False, False)
+        self.master.update_idletasks()
+        self.notification_count = getattr(self, "notification_count", 0) + 1
+        x = self.master.winfo_rootx() + self.master.winfo_width() - 320
+        y = self.master.winfo_rooty() + 40 + 30 * (self.notification_count % 5)
+        note.geometry(f"300x110+{max(0, x)}+{max(0, y)}")
+        
+        tk.Label(
+            note, text=f"{from_user} invited you to join '{chatroom}'",
+            bg="#2A2A2A", fg="#FFFFFF", wraplength=280, justify=tk.LEFT
+        ).pack(fill=tk.X, pady=(0, 10))
+        
+        def answer(join):
+            note.destroy()
+            if stored:
+                self.remove_stored_invitation(self.username, chatroom, from_user)
+            if join:
+                self.change_to_chatroom(chatroom, True)
+        
+        tk.Button(note, text="Join", bg="#4CAF50", fg="#FFFFFF", command=lambda: answer(True)).pack(side=tk.LEFT, padx=5)
+        tk.Button(note, text="Dismiss", bg="#555555", fg="#FFFFFF", command=lambda: answer(False)).pack(side=tk.LEFT, padx=5)
+        note.protocol("WM_DELETE_WINDOW", lambda: answer(False))
+    
+    def store_invitation(self, target_user, invitation_data):
+        """Store invitation in JSON format"""
+        try:
+            stored_invitations = {}
+            if os.path.exists(INVITATIONS_FILE):
+                with open(INVITATIONS_FILE, 'r') as f:
+                    try:
+                        stored_invitations = json.load(f)
+                    except json.JSONDecodeError:
+                        # Handle case of empty or invalid JSON file
+                        pass
+            
+            if target_user not in stored_invitations:
+                stored_invitations[target_user] = []
+                
+            stored_invitations[target_user].append(invitation_data)
+            
+            with open(INVITATIONS_FILE, 'w') as f:
+                json.dump(stored_invitations, f, indent=4)
+                
+        except Exception as e:
+            print(f"Error storing invitation: {e}")
+    
+    def remove_stored_invitation(self, username, chatroom, from_user):
+        """Remove invitation from JSON file"""
+        try:
+            if os.path.exists(INVITATIONS_FILE):
+                with open(INVITATIONS_FILE, 'r') as f:
+                    try:
+                        stored_invitations = json.load(f)
+                    except json.JSONDecodeError:
+                        return
+                
+                if username in stored_invitations:
+                    stored_invitations[username] = [
+                        inv for inv in stored_invitations[username] 
+                        if not (inv.get("chatroom") == chatroom and inv.get("from") == from_user)
+                    ]
+                    
+                    with open(INVITATIONS_FILE, 'w') as f:
+                        json.dump(stored_invitations, f, indent=4)
+        except Exception as e:
+            print(f"Error removing stored invitation: {e}")
+    
+    def remember_message(self, timestamp, username, message, tag_name, message_id):
+        """Remember recent messages per room for the warm-start snapshot"""
+        history = self.recent_messages.get(self.chatroom)
+        if history is None:
+            history = self.recent_messages[self.chatroom] = deque(maxlen=SNAPSHOT_MESSAGES)
+        history.append((timestamp, username, message, tag_name, message_id))
+        self.snapshot_dirty = True
+    
+    def message_rendered(self, timestamp, username, message, tag_name, message_id):
+        """ChatView listener: runs for every line put on screen, styled or plain"""
+        self.remember_message(timestamp, username, message, tag_name, message_id)
+        if message_id and self.view.latest and self.view.latest[0] == message_id:
+            self.receipts.dirty = True
+        if self.on_rendered is not None:
+            self.on_rendered(username, message)
+    
+    def update_chat_display(self, timestamp, username, message, tag_name, message_id=None, highlights=()):
+        self.view.show(timestamp, username, message, tag_name, message_id, highlights)
+    
+    def apply_message_change(self, visit, change, message_id, username, text):
+        """Patch a rendered message in place after an edit or delete"""
+        if visit != self.room_visit:
+            return  # Queued before a room switch; the message is no longer on screen
+        if change == "edit":
+            new_text, tags = f"{text} (edited)", "message"
+        else:
+            new_text, tags = "(message deleted)", ("message", "deleted")
+        if not self.view.change(message_id, username, new_text, tags):
+            return  # Unknown, trimmed, or not the author's own message
+        
+        # Keep the snapshot in step with what is on screen
+        if self.history is not None:
+            self.history.edit(message_id, new_text)
+        
+        history = self.recent_messages.get(self.chatroom, ())
+        for i, (timestamp, author, message, tag_name, *rest) in enumerate(history):
+            if rest and rest[0] == message_id:
+                history[i] = (timestamp, author, new_text, tag_name, message_id)
+                self.snapshot_dirty = True
+                break
+    
+    def send_message_change(self, change, text=""):
+        """Edit or delete the last message this user sent in the current room"""
+        if not self.my_message_ids:
+            return
+        message_id = self.my_message_ids[-1]
+        if change == "delete":
+            self.my_message_ids.pop()
+        
+        payload = {"type": change, "id": message_id, "username": self.username}
+        if change == "edit":
+            payload["message"] = text
+        self.publish(self.chat_topic, payload, expiry=CHAT_MESSAGE_EXPIRY)
+    
+    def send_message(self, event=None):
+        message = self.message_entry.get().strip()
+        if not message:
+            return
+        
+        self.message_entry.delete(0, tk.END)
+        self.stop_typing()
+        
+        if message.lower() == "/exit":
+            self.on_closing()
+            return
+        
+        # /edit <text> and /delete change your last message
+        if message.lower().startswith("/edit "):
+            self.send_message_change("edit", message[6:].strip())
+            return
+        if message.lower() == "/delete":
+            self.send_message_change("delete")
+            return
+        
+        # Send message to chatroom
+        message_id = uuid.uuid4().hex[:16]
+        self.my_message_ids = self.my_message_ids[-99:] + [message_id]
+        message_payload = {
+            "id": message_id,
+            "username": self.username,
+            "message": message,
+            "timestamp": clock()
+        }
+        
+        self.publish(self.chat_topic, message_payload, expiry=CHAT_MESSAGE_EXPIRY,
+                     metadata={"color": self.my_color})
+    
+    def apply_receipt(self, visit, username, message_id):
+        """Record that a member has read up to one of our rendered messages"""
+        if visit != self.room_visit:
+            return
+        self.view.flush()  # The message may still be in this frame's plain batch
+        entry = self.view.marks.get(message_id)
+        if entry is not None:
+            self.receipts.update(username, entry[0])
+    
+    def refresh_receipts(self):
+        """Publish our read mark (debounced) and redraw "seen by" at most once per tick"""
+        latest = self.view.latest
+        if latest is not None:
+            # Rendered while the window has focus counts as read
+            now = time.monotonic()
+            if (latest[0] != self.receipt_sent and self.master.focus_displayof() is not None
+                    and now - self.receipt_sent_at >= self.receipts.interval()):
+                self.receipt_sent, self.receipt_sent_at = latest[0], now
+                self.publish(self.receipt_topic, {"username": self.username, "last": latest[0]},
+                             expiry=int(self.receipts.interval()) + 1)
+            
+            if self.receipts.dirty:
+                self.receipts.dirty = False
+                seen = self.receipts.seen_by(latest[1], exclude=(latest[2],))
+                self.receipt_var.set(f"✓ Seen by {seen}" if seen else "")
+        self.master.after(RECEIPT_REFRESH_MS, self.refresh_receipts)
+    
+    def start_capture(self, path):
+        """Record all inbound traffic to a capture file until exit"""
+        self.capture = TrafficCapture(path)
+    
+    def start_replay(self, path, speed=1.0):
+        """Feed a capture into on_message at the given speed (0 = as fast as possible)"""
+        stats = ReplayStats()
+        self.on_rendered = stats.render
+        
+        def feed():
+            start = time.perf_counter()
+            for offset, topic, payload in read_capture(path):
+                if speed:
+                    delay = start + offset / speed - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                stats.inject(payload)
+                self.on_message(self.client, None, LoopbackMessage(topic, payload, None, time.monotonic()))
+            self.master.after(0, wait_for_backlog)
+        
+        def wait_for_backlog():
+            if self.lanes.pending():
+                self.master.after(50, wait_for_backlog)
+                return
+            self.on_rendered = None
+            report = stats.report()
+            print(report)
+            self.set_status(report)
+        
+        threading.Thread(target=feed, daemon=True).start()
+    
+    def set_status(self, text):
+        """Set the connection status, keeping any typing indicator after it"""
+        self.status_text = text
+        typing = self.typing_tracker.summary() if hasattr(self, "typing_tracker") else ""
+        if self.diagnostics.active:
+            text = f"{text}  [capturing diagnostics]"
+        if self.view.governor.mode == "plain":
+            text = f"{text}  [busy room: plain rendering]"
+        self.status_var.set(f"{text}  —  {typing}" if typing else text)
+    
+    def on_typing(self, event=None):
+        """Debounced typing signal: one publish per TYPING_REPUBLISH at most"""
+        if event is not None and event.keysym == "Return":
+            return
+        
+        now = time.monotonic()
+        if now - self.typing_sent_at >= TYPING_REPUBLISH:
+            self.typing_sent_at = now
+            self.publish(self.typing_topic, {"username": self.username, "typing": True}, expiry=TYPING_TTL)
+        
+        if self.typing_stop_job is not None:
+            self.master.after_cancel(self.typing_stop_job)
+        self.typing_stop_job = self.master.after(TYPING_IDLE * 1000, self.stop_typing)
+    
+    def stop_typing(self):
+        if self.typing_stop_job is not None:
+            self.master.after_cancel(self.typing_stop_job)
+            self.typing_stop_job = None
+        if self.typing_sent_at:
+            self.typing_sent_at = 0
+            self.publish(self.typing_topic, {"username": self.username, "typing": False}, expiry=TYPING_TTL)
+    
+    def refresh_typing_status(self):
+        """Coalesce typing updates into at most one status bar change per tick"""
+        tracker = self.typing_tracker
+        tracker.expire()
+        if tracker.dirty:
+            tracker.dirty = False
+            self.set_status(self.status_text)
+        self.master.after(TYPING_REFRESH_MS, self.refresh_typing_status)
+    
+    def on_closing(self):
+        try:
+            self.stop_typing()
+            if self.prober is not None:
+                self.prober.stop()
+            self.save_room_activity()
+            self.save_snapshot()
+            if self.capture is not None:
+                self.capture.close()
+            self.history.close()
+            self.send_system_message(f"{self.username} has left the chat")
+            time.sleep(0.5)  # Give time for message to be sent
+            self.client.disconnect()
+        except:
+            pass
+        
+        self.master.destroy()
+
+def main():
+    parser = argparse.ArgumentParser(description="Jack Chat")
+    parser.add_argument("--capture", metavar="FILE", help="record incoming traffic to a capture file")
+    parser.add_argument("--replay", metavar="FILE", help="replay a capture file into the chat window")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed, e.g. 10 for 10x; 0 = as fast as possible")
+    parser.add_argument("--headless", action="store_true", help="replay without a window or broker and print a report")
+    parser.add_argument("--worker", metavar="GROUP", help="archive --room as one of a shared subscription group, without a window")
+    parser.add_argument("--export", metavar="FILE", help="export history to JSONL (.gz/.bz2/.xz/.zst to compress)")
+    parser.add_argument("--import", dest="import_file", metavar="FILE", help="import a history export")
+    parser.add_argument("--room", help="only export/import this room; the room a --worker archives")
+    parser.add_argument("--user", help="only export/import this user's messages and data")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="only messages from this time (ISO format)")
+    parser.add_argument("--until", type=datetime.fromisoformat, help="only messages before this time (ISO format)")
+    args = parser.parse_args()
+    
+    if args.export or args.import_file:
+        filters = dict(room=args.room, user=args.user,
+                       since=args.since.timestamp() if args.since else None,
+                       until=args.until.timestamp() if args.until else None)
+        try:
+            if args.export:
+                print(f"Exported {export_history(args.export, **filters)} records to {args.export}")
+            else:
+                counts = import_history(args.import_file, **filters)
+                counts = {kind: n for kind, n in counts.items() if n}
+                print("Imported " + (", ".join(f"{n} {kind}" for kind, n in counts.items()) or "nothing new"))
+        except (OSError, RuntimeError, ValueError) as e:
+            print(f"History transfer failed: {e}")
+            sys.exit(1)
+        sys.exit(0)
+    
+    if args.worker:
+        if not args.room:
+            parser.error("--worker needs --room")
+        history = HistoryStore()
+        worker = create_headless_app(f"{args.worker}-worker", args.room, share_group=args.worker,
+                                     transport=TRANSPORT, history=history)
+        print(f"Archiving {args.room} as part of {args.worker}; Ctrl-C to stop")
+        try:
+            worker.master.run()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            worker.client.disconnect()
+            history.close()
+        sys.exit(0)
+    
+    if args.replay and args.headless:
+        print(replay_headless(args.replay, args.speed))
+        sys.exit(0)
+    
+    root = tk.Tk()
+    app = ChatApp(root)
+    if args.capture:
+        app.start_capture(args.capture)
+    if args.replay:
+        app.start_replay(args.replay, args.speed)
+    root.mainloop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,505 @@
+"""Tk-free machinery of the full client: chat rules, receipts, typing,
+traffic capture, headless event loops and diagnostics."""
+import json, time, threading, os, struct, sys, io, heapq
+import cProfile, pstats, tracemalloc
+from collections import deque, Counter
+from datetime import datetime
+from array import array
+import re
+
+CAPTURE_SECONDS = 30  # Length of a diagnostics capture window
+SAMPLE_INTERVAL = 0.005  # Seconds between stack samples of every thread
+PROCESS_WIDE_PROFILER = sys.version_info >= (3, 12)  # cProfile on sys.monitoring: one profiler, every thread
+RECEIPT_INTERVAL = 5  # Minimum seconds between our read receipts
+RECEIPT_ROOM_RATE = 50  # Receipts/second a whole room should stay under; big rooms publish less often
+RECEIPT_REFRESH_MS = 500
+
+# Typing indicator timings (seconds)
+TYPING_REPUBLISH = 3  # At most one "typing" publish per user in this window
+TYPING_IDLE = 4  # Send "stopped typing" after this long without a keystroke
+TYPING_TTL = 6  # Receivers forget a typist they haven't heard from in this long
+TYPING_REFRESH_MS = 300  # Coalesced status bar refresh interval
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton: finds every keyword in one pass over the text"""
+    def __init__(self, keywords):
+        # keywords: iterable of (keyword, kind); matching is case-insensitive
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        for keyword, kind in keywords:
+            keyword = keyword.lower()
+            if not keyword:
+                continue
+            state = 0
+            for char in keyword:
+                nxt = self.goto[state].get(char)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[state][char] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                state = nxt
+            self.output[state].append((len(keyword), kind))
+        
+        # Breadth-first failure links
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self.goto[state].items():
+                queue.append(nxt)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(char, 0)
+                self.fail[nxt] = target if target != nxt else 0
+                self.output[nxt] = self.output[nxt] + self.output[self.fail[nxt]]
+    
+    def search(self, text):
+        """Yield (start, end, kind) for every keyword occurrence"""
+        lowered = text.lower()
+        if len(lowered) != len(text):
+            lowered = text  # Lowercasing changed offsets; fall back to exact matching
+        goto, fail, output = self.goto, self.fail, self.output
+        state = 0
+        for i, char in enumerate(lowered):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for length, kind in output[state]:
+                yield i + 1 - length, i + 1, kind
+
+def is_word_char(char):
+    return char.isalnum() or char == "_"
+
+def whole_word(text, start, end):
+    """True unless text[start:end] continues a word on either side (edges like "@" or "+" always pass)"""
+    if start > 0 and is_word_char(text[start]) and is_word_char(text[start - 1]):
+        return False
+    if end < len(text) and is_word_char(text[end - 1]) and is_word_char(text[end]):
+        return False
+    return True
+
+class ChatRules:
+    """Per-user highlight, mute and hide rules compiled for one pass per message.
+    
+    Highlight keywords and plain hide patterns share one Aho-Corasick automaton,
+    hide patterns written as "re:<regex>" are joined into a single regex, and
+    muted users are a set. Highlights only count as whole words ("al" doesn't
+    light up "also"); hide patterns match anywhere. Instances are immutable;
+    changing rules builds a new one.
+    """
+    HIGHLIGHT, HIDE = 0, 1
+    
+    def __init__(self, username="", keywords=(), muted=(), hide=()):
+        self.username = username
+        self.keywords = [k for k in keywords if k]
+        self.muted = [u for u in muted if u]
+        self.hide = [h for h in hide if h]
+        
+        self.muted_set = frozenset(u.lower() for u in self.muted)
+        entries = [(k, self.HIGHLIGHT) for k in self.keywords]
+        if username:
+            entries.append((username, self.HIGHLIGHT))
+        entries += [(h, self.HIDE) for h in self.hide if not h.startswith("re:")]
+        self.automaton = KeywordAutomaton(entries) if entries else None
+        
+        regexes = []
+        for pattern in self.hide:
+            if pattern.startswith("re:"):
+                try:
+                    re.compile(pattern[3:])
+                    regexes.append(f"(?:{pattern[3:]})")
+                except re.error as e:
+                    print(f"Ignoring invalid hide pattern {pattern!r}: {e}")
+        self.hide_regex = re.compile("|".join(regexes), re.IGNORECASE) if regexes else None
+    
+    def evaluate(self, username, message):
+        """None if the message should not be shown, else merged highlight spans"""
+        if username.lower() in self.muted_set:
+            return None
+        if self.hide_regex is not None and self.hide_regex.search(message):
+            return None
+        
+        spans = []
+        if self.automaton is not None:
+            for start, end, kind in self.automaton.search(message):
+                if kind == self.HIDE:
+                    return None
+                if whole_word(message, start, end):
+                    spans.append((start, end))
+        if len(spans) > 1:
+            spans.sort()
+            merged = [spans[0]]
+            for start, end in spans[1:]:
+                if start <= merged[-1][1]:
+                    merged[-1] = (merged[-1][0], max(end, merged[-1][1]))
+                else:
+                    merged.append((start, end))
+            spans = merged
+        return spans
+    
+    def to_dict(self):
+        return {"keywords": self.keywords, "muted": self.muted, "hide": self.hide}
+
+class Diagnostics:
+    """Bounded profiling and allocation-tracing captures, written to the home directory.
+    
+    Nothing is installed while idle: cProfile covers the Tk thread plus the
+    network thread's message callbacks (on 3.12+ a single profiler sees every
+    thread, and only one may be active per process), the sampler walks every
+    thread's stack through sys._current_frames(), and tracemalloc records
+    allocation sites.
+    """
+    def __init__(self, master):
+        self.master = master
+        self.active = False
+        self.tk_profiler = None
+        self.network_profiler = None  # Checked by ChatApp.on_message
+        self.samples = None
+        self.sampler = None
+        self.sampling_done = None
+        self.tracing = False
+        self.started_at = 0
+    
+    def start(self, cprofile=False, sampling=False, memory=False, seconds=CAPTURE_SECONDS, on_done=None):
+        if self.active or not (cprofile or sampling or memory):
+            return False
+        self.active = True
+        self.started_at = time.time()
+        if cprofile:
+            self.tk_profiler = cProfile.Profile()
+            try:
+                self.tk_profiler.enable()  # The calling (Tk) thread only, before 3.12
+            except ValueError as e:
+                # Another profiler or debugger holds the hook; the sampler still works
+                print(f"cProfile unavailable ({e}), sampling instead")
+                self.tk_profiler = None
+                sampling = True
+            else:
+                if not PROCESS_WIDE_PROFILER:
+                    self.network_profiler = cProfile.Profile()
+        if sampling:
+            self.samples = Counter()
+            self.sampling_done = threading.Event()
+            self.sampler = threading.Thread(target=self.sample_threads,
+                                            args=(self.samples, self.sampling_done), daemon=True)
+            self.sampler.start()
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start(25)
+            self.tracing = True
+        self.master.after(int(seconds * 1000), self.stop, on_done)
+        return True
+    
+    def sample_threads(self, samples, done):
+        names = {}
+        me = threading.get_ident()
+        while not done.is_set():
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                if ident not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack = []
+                while frame is not None and len(stack) < 40:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                    frame = frame.f_back
+                samples[(names.get(ident, str(ident)), tuple(reversed(stack)))] += 1
+            done.wait(SAMPLE_INTERVAL)
+    
+    def stop(self, on_done=None):
+        if not self.active:
+            return None
+        out = io.StringIO()
+        elapsed = time.time() - self.started_at
+        out.write(f"Jack Chat diagnostics, {elapsed:.1f}s captured at {datetime.now().isoformat()}\n")
+        
+        if self.tk_profiler is not None:
+            self.tk_profiler.disable()
+            network_profiler, self.network_profiler = self.network_profiler, None
+            if network_profiler is None:
+                profilers = (("all threads", self.tk_profiler),)
+            else:
+                profilers = (("Tk thread", self.tk_profiler), ("network thread callbacks", network_profiler))
+            for name, profiler in profilers:
+                out.write(f"\n=== cProfile: {name} ===\n")
+                try:
+                    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(40)
+                except TypeError:
+                    out.write("(no calls recorded)\n")
+            self.tk_profiler = None
+        
+        if self.samples is not None:
+            # Let the sampler finish its pass before reading the Counter it writes to
+            self.sampling_done.set()
+            self.sampler.join()
+            samples, self.samples, self.sampler = self.samples, None, None
+            total = sum(samples.values()) or 1
+            leaf = Counter()
+            for (thread, stack), count in samples.items():
+                if stack:
+                    leaf[(thread, stack[-1])] += count
+            out.write(f"\n=== Sampling profiler: {total} samples, all threads ===\n")
+            for (thread, frame), count in leaf.most_common(40):
+                out.write(f"{100 * count / total:6.2f}%  [{thread}] {frame}\n")
+            out.write("\n--- Collapsed stacks (flamegraph.pl format) ---\n")
+            for (thread, stack), count in samples.most_common(200):
+                out.write(f"{thread};{';'.join(stack)} {count}\n")
+        
+        if self.tracing:
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            self.tracing = False
+            out.write("\n=== tracemalloc: top allocation sites ===\n")
+            for stat in snapshot.statistics("lineno")[:30]:
+                out.write(f"{stat}\n")
+        
+        path = os.path.join(os.path.expanduser("~"),
+                            f".jack_chat_profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}.txt")
+        try:
+            with open(path, 'w') as f:
+                f.write(out.getvalue())
+        except Exception as e:
+            print(f"Error writing diagnostics: {e}")
+            path = None
+        self.active = False
+        if on_done:
+            on_done(path)
+        return path
+
+class TrafficCapture:
+    """Records raw inbound traffic (arrival offset, topic, payload) to a compact binary file"""
+    MAGIC = b"JCCAP1\n"
+    RECORD = struct.Struct("!dHI")  # seconds since capture start, topic length, payload length
+    
+    def __init__(self, path):
+        self.file = open(path, 'wb')
+        self.file.write(self.MAGIC)
+        self.start = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def record(self, topic, payload):
+        topic = topic.encode()
+        with self.lock:
+            if self.file is not None:
+                self.file.write(self.RECORD.pack(time.monotonic() - self.start, len(topic), len(payload)) + topic + payload)
+    
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+def read_capture(path):
+    """Yield (offset, topic, payload) records from a capture file"""
+    record = TrafficCapture.RECORD
+    with open(path, 'rb') as f:
+        if f.read(len(TrafficCapture.MAGIC)) != TrafficCapture.MAGIC:
+            raise ValueError(f"{path} is not a Jack Chat capture")
+        while True:
+            header = f.read(record.size)
+            if len(header) < record.size:
+                return
+            offset, topic_length, payload_length = record.unpack(header)
+            yield offset, f.read(topic_length).decode(), f.read(payload_length)
+
+class ReplayStats:
+    """Matches replayed messages to their rendering to report throughput and latency"""
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.injected = 0
+        self.rendered = 0
+        self.in_flight = {}  # (username, message) -> deque of injection times
+        self.latencies = []
+        self.started = None
+        self.finished = None
+    
+    def inject(self, payload):
+        if self.started is None:
+            self.started = self.clock()
+        self.injected += 1
+        try:
+            data = json.loads(payload)
+            key = (data.get("username", "unknown user"), data.get("message", ""))
+        except Exception:
+            return
+        self.in_flight.setdefault(key, deque()).append(self.clock())
+    
+    def render(self, username, message):
+        now = self.clock()
+        self.rendered += 1
+        self.finished = now
+        times = self.in_flight.get((username, message))
+        if times:
+            self.latencies.append(now - times.popleft())
+    
+    def report(self):
+        elapsed = (self.finished or self.clock()) - (self.started or 0)
+        latencies = sorted(self.latencies)
+        pick = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000 if latencies else 0
+        return (f"Replayed {self.injected} messages, rendered {self.rendered} in {elapsed:.3f}s "
+                f"({self.rendered / elapsed if elapsed > 0 else 0:.0f} msg/s); latency ms "
+                f"p50 {pick(0.5):.2f}, p99 {pick(0.99):.2f}, max {pick(1.0):.2f}")
+
+class HeadlessMaster:
+    """Stand-in for the Tk root: after() callbacks run from a virtual-time event loop.
+    
+    The clock jumps straight to the next due callback, so a replay never sleeps
+    and its injection schedule is the same on every run. Time spent inside
+    callbacks is measured (perf_counter) and added to the clock, so latency and
+    throughput reflect the real cost of the code under test. Pass callback_cost
+    to charge a fixed modeled cost per callback instead, for fully
+    reproducible timings.
+    """
+    def __init__(self, callback_cost=None):
+        self.callback_cost = callback_cost
+        self.now = 0.0
+        self.started = None  # perf_counter() when the running callback began
+        self.events = []
+        self.counter = 0
+        self.cancelled = set()
+    
+    def after(self, ms, func=None, *args):
+        self.counter += 1
+        heapq.heappush(self.events, (self.clock() + ms / 1000, self.counter, func, args))
+        return self.counter
+    
+    def after_cancel(self, job):
+        self.cancelled.add(job)
+    
+    def clock(self):
+        if self.started is not None:
+            return self.now + time.perf_counter() - self.started
+        return self.now
+    
+    def run(self):
+        while self.events:
+            due, job, func, args = heapq.heappop(self.events)
+            if job in self.cancelled:
+                continue
+            self.now = max(self.now, due)
+            if self.callback_cost is None:
+                self.started = time.perf_counter()
+                try:
+                    func(*args)
+                finally:
+                    self.now, self.started = self.clock(), None
+            else:
+                func(*args)
+                self.now += self.callback_cost
+
+class WorkerMaster:
+    """Stand-in for the Tk root in a headless worker on a real broker.
+    
+    after() may be called from any thread (the network thread posts to the
+    lanes); callbacks run in real time on the thread that calls run().
+    """
+    def __init__(self):
+        self.events = []
+        self.counter = 0
+        self.cancelled = set()
+        self.running = True
+        self.condition = threading.Condition()
+    
+    def after(self, ms, func=None, *args):
+        with self.condition:
+            self.counter += 1
+            heapq.heappush(self.events, (time.monotonic() + ms / 1000, self.counter, func, args))
+            self.condition.notify()
+            return self.counter
+    
+    def after_cancel(self, job):
+        with self.condition:
+            self.cancelled.add(job)
+    
+    def run(self):
+        while True:
+            with self.condition:
+                while self.running and (not self.events or self.events[0][0] > time.monotonic()):
+                    self.condition.wait(self.events[0][0] - time.monotonic() if self.events else None)
+                if not self.running:
+                    return
+                due, job, func, args = heapq.heappop(self.events)
+                if job in self.cancelled:
+                    self.cancelled.discard(job)
+                    continue
+            try:
+                func(*args)
+            except Exception as e:
+                print(f"Error in worker callback: {e}")
+    
+    def destroy(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+
+class ReadReceipts:
+    """Last-read sequence per room member, kept in one flat array indexed by member number"""
+    def __init__(self):
+        self.members = {}  # username -> index into last_read
+        self.last_read = array('I')
+        self.dirty = False
+    
+    def update(self, username, seq):
+        index = self.members.get(username)
+        if index is None:
+            index = self.members[username] = len(self.last_read)
+            self.last_read.append(0)
+        if seq > self.last_read[index]:
+            self.last_read[index] = seq
+            self.dirty = True
+    
+    def seen_by(self, seq, exclude=()):
+        """How many members have read up to (at least) seq"""
+        count = sum(1 for read in self.last_read if read >= seq)
+        for username in exclude:
+            index = self.members.get(username)
+            if index is not None and self.last_read[index] >= seq:
+                count -= 1
+        return count
+    
+    def interval(self):
+        """Seconds between our receipts so the room as a whole stays near RECEIPT_ROOM_RATE"""
+        return max(RECEIPT_INTERVAL, len(self.members) / RECEIPT_ROOM_RATE)
+
+class TypingTracker:
+    """Compact map of who is typing in the current room, with expiry"""
+    def __init__(self, ttl=TYPING_TTL):
+        self.ttl = ttl
+        self.typists = {}  # username -> expiry time
+        self.dirty = False
+    
+    def update(self, username, typing, now=None):
+        now = time.monotonic() if now is None else now
+        if typing:
+            if username not in self.typists:
+                self.dirty = True
+            self.typists[username] = now + self.ttl
+        elif self.typists.pop(username, None) is not None:
+            self.dirty = True
+    
+    def expire(self, now=None):
+        now = time.monotonic() if now is None else now
+        # Snapshot first: the network thread may update the map concurrently
+        expired = [user for user, until in list(self.typists.items()) if until <= now]
+        for user in expired:
+            self.typists.pop(user, None)
+        if expired:
+            self.dirty = True
+    
+    def clear(self):
+        if self.typists:
+            self.typists = {}
+            self.dirty = True
+    
+    def summary(self):
+        names = sorted(self.typists)
+        if not names:
+            return ""
+        if len(names) == 1:
+            return f"{names[0]} is typing…"
+        if len(names) <= 3:
+            return f"{', '.join(names[:-1])} and {names[-1]} are typing…"
+        return f"{len(names)} people are typing…"
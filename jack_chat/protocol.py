@@ -0,0 +1,544 @@
+"""Wire protocol and transports shared by every Jack Chat front-end.
+
+Nothing here imports tkinter, so a front-end only pays for the widgets it uses.
+"""
+import paho.mqtt.client as mqtt
+import json, time, threading, os, socket, select, struct, zlib, uuid
+from collections import deque
+from datetime import datetime
+
+# Color and MQTT configurations
+COLORS = {
+    "red": "#FF6B6B", "green": "#4AFF65", "blue": "#63B8FF", 
+    "yellow": "#FFF07C", "magenta": "#FF5DC8", "cyan": "#00FFFF", "white": "#FFFFFF"
+}
+
+MQTT_BROKER, MQTT_PORT = "broker.hivemq.com", 1883
+MQTT_WS_PORT, MQTT_WS_PATH = 8000, "/mqtt"
+
+# Brokers to choose from over TCP. Only MQTT_BROKER by default, so every client (including
+# GUI/1.py and older ones) meets in the same place; opt in with e.g.
+# JACK_CHAT_BROKERS="localhost:1883,localhost:1884"
+MQTT_BROKERS = [(MQTT_BROKER, MQTT_PORT)]
+if os.environ.get("JACK_CHAT_BROKERS"):
+    MQTT_BROKERS = [(host, int(port)) for host, port in
+                    (entry.strip().rsplit(":", 1) for entry in os.environ["JACK_CHAT_BROKERS"].split(","))]
+BROKER_SELECTION = "room"  # "room": rooms agree on a broker via hashing; "fastest": lowest latency wins
+PROBE_TIMEOUT = 3.0  # Seconds before a probe counts the broker as unhealthy
+BROKER_REPROBE_SECONDS = 60
+MAX_HEALTHY_RTT = 1.0  # Round trips slower than this (seconds) count as unhealthy
+MIGRATE_MARGIN = 0.3  # "fastest" mode only moves for a broker this much (30%) faster
+MQTT_UNIX_SOCKET = "/var/run/mosquitto/mosquitto.sock"
+TRANSPORT = os.environ.get("JACK_CHAT_TRANSPORT", "tcp")  # tcp, websockets, unix, loopback or multicast
+
+# Broker-less LAN mode (TRANSPORT = "multicast")
+MULTICAST_PREFIX = "239.255"  # Administratively scoped; one group per room
+MULTICAST_PORT = 50100
+MULTICAST_INTERFACE = os.environ.get("JACK_CHAT_MULTICAST_IF", "0.0.0.0")  # "127.0.0.1" for loopback
+MULTICAST_TTL = 1  # Stay on the local subnet
+RETRANSMIT_WINDOW = 64  # Datagrams per group kept for answering NACKs
+BASE_TOPIC = "jack-chat"
+MQTT_USERNAME, MQTT_PASSWORD = "test", "test"
+
+# MQTT v5 options (opt-in; falls back to 3.1.1 when the broker refuses v5)
+MQTT_V5 = os.environ.get("JACK_CHAT_MQTT_V5") == "1"
+CHAT_MESSAGE_EXPIRY = 5 * 60  # Seconds a queued chat line stays deliverable
+INVITATION_EXPIRY = 24 * 60 * 60  # Seconds a queued invitation stays deliverable
+
+class UnixSocketClient(mqtt.Client):
+    """paho client speaking MQTT over a Unix-domain socket (host is the socket path)"""
+    def _create_socket_connection(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self._connect_timeout)
+        sock.connect(self._host)
+        return sock
+
+class LoopbackMessage:
+    """Mirror of paho's MQTTMessage fields used by the app"""
+    __slots__ = ("topic", "payload", "properties", "timestamp")
+    
+    def __init__(self, topic, payload, properties, timestamp):
+        self.topic = topic
+        self.payload = payload
+        self.properties = properties
+        self.timestamp = timestamp
+
+class LoopbackBus:
+    """In-process broker: publishes hand the same message object to every subscriber.
+    
+    Delivery is queued per client and only happens when a client loops, or when
+    pump() drains every inbox in order, so tests and benchmarks get deterministic
+    ordering and (with an injected clock) deterministic timing.
+    """
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.exact = {}  # topic -> [client]
+        self.wildcards = []  # (filter, client)
+        self.shared = {}  # (group, filter) -> [client]
+        self.shared_turn = {}
+        self.clients = []
+        self.lock = threading.Lock()
+    
+    def attach(self, client):
+        with self.lock:
+            self.clients.append(client)
+    
+    def detach(self, client):
+        with self.lock:
+            if client in self.clients:
+                self.clients.remove(client)
+            for subscribers in self.exact.values():
+                if client in subscribers:
+                    subscribers.remove(client)
+            self.wildcards = [(f, c) for f, c in self.wildcards if c is not client]
+            for members in self.shared.values():
+                if client in members:
+                    members.remove(client)
+    
+    def subscribe(self, client, topic_filter):
+        with self.lock:
+            if topic_filter.startswith("$share/"):
+                _, group, topic_filter = topic_filter.split("/", 2)
+                members = self.shared.setdefault((group, topic_filter), [])
+                if client not in members:
+                    members.append(client)
+            elif "+" in topic_filter or "#" in topic_filter:
+                if (topic_filter, client) not in self.wildcards:
+                    self.wildcards.append((topic_filter, client))
+            else:
+                subscribers = self.exact.setdefault(topic_filter, [])
+                if client not in subscribers:
+                    subscribers.append(client)
+    
+    def unsubscribe(self, client, topic_filter):
+        with self.lock:
+            if topic_filter.startswith("$share/"):
+                _, group, topic_filter = topic_filter.split("/", 2)
+                members = self.shared.get((group, topic_filter), [])
+                if client in members:
+                    members.remove(client)
+            elif (topic_filter, client) in self.wildcards:
+                self.wildcards.remove((topic_filter, client))
+            elif client in self.exact.get(topic_filter, ()):
+                self.exact[topic_filter].remove(client)
+    
+    def publish(self, topic, payload, properties=None):
+        message = LoopbackMessage(topic, payload, properties, self.clock())
+        with self.lock:
+            targets = list(self.exact.get(topic, ()))
+            targets += [c for f, c in self.wildcards if mqtt.topic_matches_sub(f, topic)]
+            for (group, topic_filter), members in self.shared.items():
+                if members and mqtt.topic_matches_sub(topic_filter, topic):
+                    turn = self.shared_turn.get((group, topic_filter), 0)
+                    targets.append(members[turn % len(members)])
+                    self.shared_turn[(group, topic_filter)] = turn + 1
+        for client in targets:
+            client.enqueue(message)
+        return len(targets)
+    
+    def pump(self):
+        """Deliver everything queued, round-robin across clients; returns the count"""
+        delivered = 0
+        while True:
+            progress = sum(client.loop(0) for client in list(self.clients))
+            if not progress:
+                return delivered
+            delivered += progress
+
+class LoopbackInfo:
+    rc = mqtt.MQTT_ERR_SUCCESS
+    mid = 0
+    
+    def is_published(self):
+        return True
+    
+    def wait_for_publish(self, timeout=None):
+        pass
+
+class LoopbackClient:
+    """Drop-in for the parts of paho.mqtt.client.Client the app uses, on a LoopbackBus"""
+    def __init__(self, bus, protocol=mqtt.MQTTv311):
+        self.bus = bus
+        self.protocol = protocol
+        self.userdata = None
+        self.on_connect = None
+        self.on_message = None
+        self.inbox = deque()
+        self.ready = threading.Condition()
+        self.connected = False
+    
+    def user_data_set(self, userdata):
+        self.userdata = userdata
+    
+    def username_pw_set(self, username, password=None):
+        pass
+    
+    def connect(self, host=None, port=None, keepalive=60):
+        self.bus.attach(self)
+        self.connected = True
+        if self.on_connect:
+            if self.protocol == mqtt.MQTTv5:
+                self.on_connect(self, self.userdata, {}, 0, None)
+            else:
+                self.on_connect(self, self.userdata, {}, 0)
+        return mqtt.MQTT_ERR_SUCCESS
+    
+    def disconnect(self):
+        self.connected = False
+        self.bus.detach(self)
+        with self.ready:
+            self.ready.notify_all()
+        return mqtt.MQTT_ERR_SUCCESS
+    
+    def subscribe(self, topic, qos=0):
+        self.bus.subscribe(self, topic)
+        return (mqtt.MQTT_ERR_SUCCESS, 0)
+    
+    def unsubscribe(self, topic):
+        self.bus.unsubscribe(self, topic)
+        return (mqtt.MQTT_ERR_SUCCESS, 0)
+    
+    def publish(self, topic, payload=None, qos=0, retain=False, properties=None):
+        if isinstance(payload, str):
+            payload = payload.encode()
+        self.bus.publish(topic, payload, properties)
+        return LoopbackInfo()
+    
+    def enqueue(self, message):
+        with self.ready:
+            self.inbox.append(message)
+            self.ready.notify()
+    
+    def loop(self, timeout=1.0):
+        """Deliver queued messages; returns how many were handled"""
+        if timeout and not self.inbox:
+            with self.ready:
+                self.ready.wait_for(lambda: self.inbox or not self.connected, timeout)
+        handled = 0
+        while True:
+            try:
+                message = self.inbox.popleft()
+            except IndexError:
+                break
+            if self.on_message:
+                self.on_message(self, self.userdata, message)
+            handled += 1
+        return handled
+    
+    def loop_forever(self):
+        while self.connected:
+            self.loop(1.0)
+
+def multicast_group(topic):
+    """Multicast group for a topic, derived from its room (first level below BASE_TOPIC)"""
+    parts = topic.split("/")
+    room = parts[1] if len(parts) > 1 else topic
+    digest = zlib.crc32(room.encode())
+    return f"{MULTICAST_PREFIX}.{(digest >> 8) & 0xFF}.{max(1, digest & 0xFF)}"
+
+class MulticastClient:
+    """Broker-less transport: each room's traffic goes to its own UDP multicast group.
+    
+    Datagrams carry the MQTT topic and the unchanged JSON payload behind a small
+    header with the group and a per-(sender, group) sequence number. Receivers
+    drop duplicates and NACK sequence gaps; senders answer a NACK from the
+    retransmit window of the group it names, since every group shares one port.
+    """
+    MAGIC = b"JC2"
+    DATA, NACK = 0, 1
+    HEADER = struct.Struct("!3sB8s4sIH")  # magic, kind, sender id, group, sequence, topic length / NACK count
+    
+    def __init__(self, protocol=mqtt.MQTTv311, port=MULTICAST_PORT, interface=MULTICAST_INTERFACE):
+        self.protocol = protocol
+        self.port = port
+        self.interface = interface
+        self.userdata = None
+        self.on_connect = None
+        self.on_message = None
+        self.sock = None
+        self.connected = False
+        self.sender_id = os.urandom(8)
+        self.subscriptions = set()
+        self.groups = {}  # group -> number of subscribed topics
+        self.send_seq = {}  # group -> next sequence number
+        self.window = {}  # group -> deque of (seq, datagram)
+        self.expected = {}  # (sender, group) -> next sequence number
+        self.seen = set()
+        self.seen_order = deque()
+        self.lock = threading.Lock()
+    
+    def user_data_set(self, userdata):
+        self.userdata = userdata
+    
+    def username_pw_set(self, username, password=None):
+        pass
+    
+    def connect(self, host=None, port=None, keepalive=60):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, "SO_REUSEPORT"):
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind(("", self.port))
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, MULTICAST_TTL)
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)  # We see our own messages, like MQTT
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(self.interface))
+        self.sock = sock
+        self.connected = True
+        for group in self.groups:
+            self.join_group(group)
+        if self.on_connect:
+            if self.protocol == mqtt.MQTTv5:
+                self.on_connect(self, self.userdata, {}, 0, None)
+            else:
+                self.on_connect(self, self.userdata, {}, 0)
+        return mqtt.MQTT_ERR_SUCCESS
+    
+    def disconnect(self):
+        self.connected = False
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+        return mqtt.MQTT_ERR_SUCCESS
+    
+    def join_group(self, group, join=True):
+        if self.sock is None:
+            return
+        option = socket.IP_ADD_MEMBERSHIP if join else socket.IP_DROP_MEMBERSHIP
+        membership = socket.inet_aton(group) + socket.inet_aton(self.interface)
+        self.sock.setsockopt(socket.IPPROTO_IP, option, membership)
+    
+    def subscribe(self, topic, qos=0):
+        with self.lock:
+            if topic not in self.subscriptions:
+                self.subscriptions.add(topic)
+                group = multicast_group(topic)
+                self.groups[group] = self.groups.get(group, 0) + 1
+                if self.groups[group] == 1:
+                    self.join_group(group)
+        return (mqtt.MQTT_ERR_SUCCESS, 0)
+    
+    def unsubscribe(self, topic):
+        with self.lock:
+            if topic in self.subscriptions:
+                self.subscriptions.remove(topic)
+                group = multicast_group(topic)
+                self.groups[group] -= 1
+                if not self.groups[group]:
+                    del self.groups[group]
+                    self.join_group(group, join=False)
+        return (mqtt.MQTT_ERR_SUCCESS, 0)
+    
+    def publish(self, topic, payload=None, qos=0, retain=False, properties=None):
+        if isinstance(payload, str):
+            payload = payload.encode()
+        group = multicast_group(topic)
+        topic_bytes = topic.encode()
+        with self.lock:
+            seq = self.send_seq.get(group, 0)
+            self.send_seq[group] = seq + 1
+            datagram = self.HEADER.pack(self.MAGIC, self.DATA, self.sender_id, socket.inet_aton(group), seq,
+                                        len(topic_bytes)) + topic_bytes + (payload or b"")
+            self.window.setdefault(group, deque(maxlen=RETRANSMIT_WINDOW)).append((seq, datagram))
+        if self.sock is not None:
+            self.sock.sendto(datagram, (group, self.port))
+        return LoopbackInfo()
+    
+    def send_nack(self, group, sender, first, count):
+        nack = self.HEADER.pack(self.MAGIC, self.NACK, sender, socket.inet_aton(group), first, count)
+        self.sock.sendto(nack, (group, self.port))
+    
+    def handle_datagram(self, datagram):
+        if len(datagram) < self.HEADER.size or datagram[:3] != self.MAGIC:
+            return False
+        _, kind, sender, group, seq, length = self.HEADER.unpack_from(datagram)
+        group = socket.inet_ntoa(group)
+        
+        if kind == self.NACK:
+            # Someone missed datagrams we sent to this group: resend what is still in its window
+            if sender == self.sender_id:
+                for sent_seq, sent in list(self.window.get(group, ())):
+                    if seq <= sent_seq < seq + length:
+                        self.sock.sendto(sent, (group, self.port))
+            return False
+        
+        topic = datagram[self.HEADER.size:self.HEADER.size + length].decode()
+        if multicast_group(topic) != group:
+            return False
+        key = (sender, group, seq)
+        if key in self.seen:
+            return False
+        self.seen.add(key)
+        self.seen_order.append(key)
+        if len(self.seen_order) > 64 * RETRANSMIT_WINDOW:
+            self.seen.discard(self.seen_order.popleft())
+        
+        # Ask for anything skipped between the last datagram and this one
+        expected = self.expected.get((sender, group))
+        if expected is not None and seq > expected:
+            first = max(expected, seq - RETRANSMIT_WINDOW)
+            self.send_nack(group, sender, first, seq - first)
+        if expected is None or seq >= expected:
+            self.expected[(sender, group)] = seq + 1
+        
+        if not any(mqtt.topic_matches_sub(sub, topic) for sub in list(self.subscriptions)):
+            return False
+        if self.on_message:
+            payload = datagram[self.HEADER.size + length:]
+            self.on_message(self, self.userdata, LoopbackMessage(topic, payload, None, time.monotonic()))
+        return True
+    
+    def loop(self, timeout=1.0):
+        """Handle datagrams already waiting (after up to timeout seconds); returns how many were delivered"""
+        handled = 0
+        while self.connected and self.sock is not None:
+            try:
+                ready, _, _ = select.select([self.sock], [], [], timeout)
+                if not ready:
+                    break
+                datagram = self.sock.recv(65535)
+            except (OSError, ValueError):
+                break  # Socket closed by disconnect()
+            handled += self.handle_datagram(datagram)
+            timeout = 0
+        return handled
+    
+    def loop_forever(self):
+        while self.connected:
+            self.loop(1.0)
+
+LOOPBACK_BUS = LoopbackBus()
+
+def create_mqtt_client(transport=TRANSPORT, mqtt_v5=False, bus=None):
+    """Build a client for the configured transport"""
+    protocol = mqtt.MQTTv5 if mqtt_v5 else mqtt.MQTTv311
+    if transport == "tcp":
+        return mqtt.Client(protocol=protocol)
+    if transport == "websockets":
+        client = mqtt.Client(protocol=protocol, transport="websockets")
+        client.ws_set_options(path=MQTT_WS_PATH)
+        return client
+    if transport == "unix":
+        return UnixSocketClient(protocol=protocol)
+    if transport == "loopback":
+        return LoopbackClient(bus or LOOPBACK_BUS, protocol)
+    if transport == "multicast":
+        return MulticastClient(protocol)
+    raise ValueError(f"Unknown transport: {transport}")
+
+def broker_address(transport=TRANSPORT):
+    """(host, port) to connect to for a transport"""
+    if transport == "websockets":
+        return MQTT_BROKER, MQTT_WS_PORT
+    if transport == "unix":
+        return MQTT_UNIX_SOCKET, 1  # paho wants a positive port; the socket path is the address
+    return MQTT_BROKER, MQTT_PORT
+
+def rank_brokers(room, brokers):
+    """Rendezvous-hash ranking: every client ranks brokers identically for a room"""
+    return sorted(brokers, key=lambda b: zlib.crc32(f"{b[0]}:{b[1]}/{room}".encode()), reverse=True)
+
+def choose_broker(room, brokers, probes, mode=BROKER_SELECTION, exclude=()):
+    """Pick a broker given probe results ({broker: {"healthy", "rtt", ...}}); unprobed ones count as healthy"""
+    healthy = [b for b in brokers if b not in exclude and probes.get(b, {}).get("healthy", True)]
+    if not healthy:
+        return None
+    if mode == "fastest":
+        measured = [b for b in healthy if b in probes]
+        if measured:
+            return min(measured, key=lambda b: probes[b]["rtt"])
+    return rank_brokers(room, healthy)[0]
+
+def probe_broker(host, port, timeout=PROBE_TIMEOUT):
+    """Measure connect time and publish round trip on a private probe topic"""
+    result = {"healthy": False, "connect": None, "rtt": None}
+    connected, subscribed, echoed = threading.Event(), threading.Event(), threading.Event()
+    topic = f"{BASE_TOPIC}/probe/{uuid.uuid4().hex}"
+    client = mqtt.Client()
+    client.username_pw_set(MQTT_USERNAME, MQTT_PASSWORD)
+    client.on_connect = lambda c, u, f, rc: rc == 0 and connected.set()
+    client.on_subscribe = lambda *args: subscribed.set()
+    client.on_message = lambda c, u, msg: echoed.set()
+    try:
+        start = time.perf_counter()
+        client.connect(host, port, 30)
+        client.loop_start()
+        if not connected.wait(timeout):
+            return result
+        result["connect"] = time.perf_counter() - start
+        
+        client.subscribe(topic)
+        if not subscribed.wait(timeout):
+            return result
+        start = time.perf_counter()
+        client.publish(topic, b"ping")
+        if not echoed.wait(timeout):
+            return result
+        result["rtt"] = time.perf_counter() - start
+        result["healthy"] = result["rtt"] <= MAX_HEALTHY_RTT
+    except Exception:
+        pass
+    finally:
+        try:
+            client.disconnect()
+            client.loop_stop()
+        except Exception:
+            pass
+    return result
+
+class BrokerProber:
+    """Re-probes every broker in the background and reports results through a callback"""
+    def __init__(self, brokers, on_results, interval=BROKER_REPROBE_SECONDS):
+        self.brokers = list(brokers)
+        self.on_results = on_results
+        self.interval = interval
+        self.stopped = threading.Event()
+    
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+    
+    def stop(self):
+        self.stopped.set()
+    
+    def probe_all(self):
+        """Probe every broker in parallel; one that hasn't answered by the deadline counts as unhealthy"""
+        results = {}
+        threads = [threading.Thread(target=lambda b=b: results.__setitem__(b, probe_broker(*b)), daemon=True)
+                   for b in self.brokers]
+        for thread in threads:
+            thread.start()
+        deadline = time.monotonic() + 2 * PROBE_TIMEOUT + 1
+        for thread in threads:
+            thread.join(max(0, deadline - time.monotonic()))
+        # A copy, so a straggling probe can't change the results after they are handed over
+        return {b: results.get(b, {"healthy": False, "connect": None, "rtt": None}) for b in self.brokers}
+    
+    def run(self):
+        while not self.stopped.is_set():
+            results = self.probe_all()
+            if not self.stopped.is_set():
+                self.on_results(results)
+            self.stopped.wait(self.interval)
+
+USERNAME_COLORS = [name for name in COLORS if name != "white"]
+
+def username_color(username):
+    """Consistent color for a username, never the plain message white"""
+    return COLORS[USERNAME_COLORS[sum(ord(c) for c in username) % len(USERNAME_COLORS)]]
+
+def room_topic(room):
+    return f"{BASE_TOPIC}/{room}"
+
+def clock():
+    """Message timestamp as shown in the chat"""
+    return datetime.now().strftime("%H:%M:%S")
+
+def system_payload(message):
+    return {"username": "System", "message": message, "timestamp": clock()}
+
+def decode_payload(msg):
+    return json.loads(msg.payload.decode())
+
+def chat_fields(payload):
+    """(timestamp, username, message) of a chat payload, with the defaults both clients show"""
+    return (payload.get("timestamp", "unknown time"), payload.get("username", "unknown user"),
+            payload.get("message", ""))
@@ -0,0 +1,170 @@
+"""The minimal Jack Chat client: one room, no history or settings."""
+import tkinter as tk
+from tkinter import scrolledtext, simpledialog, messagebox
+import json, time, threading
+
+from .protocol import (
+    MQTT_BROKER, MQTT_PORT, MQTT_USERNAME, MQTT_PASSWORD,
+    create_mqtt_client, room_topic, clock, system_payload, decode_payload, chat_fields
+)
+from .view import LaneScheduler, ChatView
+
+class ChatApp:
+    def __init__(self, master):
+        self.master = master
+        self.master.title("Jack Chat")
+        self.master.geometry("800x600")
+        self.master.protocol("WM_DELETE_WINDOW", self.on_closing)
+
+        # Get username and chatroom
+        self.username = simpledialog.askstring("Username", "Enter your username:", parent=master)
+        if not self.username:
+            messagebox.showerror("Error", "Username cannot be empty!")
+            master.destroy()
+            return
+
+        self.chatroom = simpledialog.askstring("Chat Room", "Enter chatroom name to join:", parent=master)
+        if not self.chatroom:
+            messagebox.showerror("Error", "Chatroom name cannot be empty!")
+            master.destroy()
+            return
+
+        # Messages reach the display through the same lanes as the full client
+        self.lanes = LaneScheduler(self.master)
+
+        # Initialize MQTT client
+        self.setup_mqtt_client()
+
+        # Create GUI elements
+        self.create_widgets()
+
+        # Connect and subscribe
+        self.connect_to_mqtt()
+
+    def setup_mqtt_client(self):
+        self.client = create_mqtt_client("tcp")
+        self.client.user_data_set({"username": self.username, "chatroom": self.chatroom})
+        self.client.username_pw_set(MQTT_USERNAME, MQTT_PASSWORD)
+        self.client.on_connect = self.on_connect
+        self.client.on_message = self.on_message
+
+    def create_widgets(self):
+        # Chat display area
+        self.chat_frame = tk.Frame(self.master)
+        self.chat_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+        # Chat history display with scrollbar (dark, so the shared username colors stay readable)
+        self.chat_display = scrolledtext.ScrolledText(self.chat_frame, wrap=tk.WORD, bg="#1E1E1E", height=20)
+        self.chat_display.pack(fill=tk.BOTH, expand=True)
+        self.view = ChatView(self.master, self.chat_display, self.lanes)
+        self.view.on_mode_change = lambda: self.set_status(self.status_text)
+        self.view.configure_tags()
+        self.chat_display.config(state=tk.DISABLED)  # Make it read-only
+
+        # Status bar
+        self.status_var = tk.StringVar()
+        self.set_status(f"Connected as {self.username} in {self.chatroom}")
+        self.status_bar = tk.Label(self.master, textvariable=self.status_var, bd=1, relief=tk.SUNKEN, anchor=tk.W)
+        self.status_bar.pack(side=tk.BOTTOM, fill=tk.X)
+
+        # Message input area
+        self.input_frame = tk.Frame(self.master)
+        self.input_frame.pack(fill=tk.X, padx=10, pady=10)
+
+        self.message_entry = tk.Entry(self.input_frame)
+        self.message_entry.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.message_entry.bind("<Return>", self.send_message)
+
+        self.send_button = tk.Button(self.input_frame, text="Send", command=self.send_message)
+        self.send_button.pack(side=tk.RIGHT)
+
+    def connect_to_mqtt(self):
+        try:
+            self.client.connect(MQTT_BROKER, MQTT_PORT, 60)
+            # Start mqtt client in a separate thread
+            threading.Thread(target=self.client.loop_forever, daemon=True).start()
+
+            # Subscribe to the chatroom
+            self.chat_topic = room_topic(self.chatroom)
+            self.client.subscribe(self.chat_topic)
+
+            # Send join notification
+            self.client.publish(self.chat_topic, json.dumps(system_payload(f"{self.username} has joined the chat")))
+
+        except Exception as e:
+            messagebox.showerror("Connection Error", f"Failed to connect: {str(e)}")
+            self.master.destroy()
+
+    def on_connect(self, client, userdata, flags, rc):
+        if rc == 0:
+            self.lanes.post("system", self.set_status, f"Connected to {MQTT_BROKER} as {self.username} in {self.chatroom}")
+        else:
+            self.lanes.post("system", self.set_status, f"Connection failed, code: {rc}")
+
+    def set_status(self, text):
+        self.status_text = text
+        if self.view.governor.mode == "plain":
+            text = f"{text}  [busy room: plain rendering]"
+        self.status_var.set(text)
+
+    def on_message(self, client, userdata, msg):
+        try:
+            payload = decode_payload(msg)
+
+            # Skip messages from self (won't show your own messages twice)
+            if payload.get("username") == userdata.get("username") and payload.get("timestamp") == getattr(self, "last_sent_timestamp", None):
+                return
+
+            # Update chat display in the main thread
+            timestamp, username, message = chat_fields(payload)
+            self.lanes.post("chat", self.view.render, timestamp, username, message, payload.get("id"))
+
+        except Exception as e:
+            print(f"Error processing message: {e}")
+
+    def send_message(self, event=None):
+        message = self.message_entry.get().strip()
+        if not message:
+            return
+
+        # Clear entry box
+        self.message_entry.delete(0, tk.END)
+
+        # Handle /exit command
+        if message.lower() == "/exit":
+            self.on_closing()
+            return
+
+        # Send message to the chatroom
+        timestamp = clock()
+        self.last_sent_timestamp = timestamp
+
+        message_payload = {
+            "username": self.username,
+            "message": message,
+            "timestamp": timestamp
+        }
+
+        # Publish message
+        self.client.publish(self.chat_topic, json.dumps(message_payload))
+
+    def on_closing(self):
+        try:
+            # Send leave notification
+            self.client.publish(self.chat_topic, json.dumps(system_payload(f"{self.username} has left the chat")))
+            time.sleep(0.5)  # Give time for message to be sent
+
+            # Disconnect
+            self.client.disconnect()
+        except:
+            pass
+
+        self.master.destroy()
+
+def main():
+    root = tk.Tk()
+    app = ChatApp(root)
+    root.mainloop()
+
+if __name__ == "__main__":
+    main()
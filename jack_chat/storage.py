@@ -0,0 +1,212 @@
+"""Files in the home directory and the local message history store."""
+import json, time, os, pickle, io, itertools, sqlite3, gzip
+from collections import Counter
+
+INVITATIONS_FILE = os.path.join(os.path.expanduser("~"), ".jack_chat_invitations.json")
+CHATROOMS_FILE = os.path.join(os.path.expanduser("~"), ".jack_chat_rooms.json")
+ROOM_ACTIVITY_FILE = os.path.join(os.path.expanduser("~"), ".jack_chat_activity.json")
+HISTORY_FILE = os.path.join(os.path.expanduser("~"), ".jack_chat_history.db")
+HISTORY_FLUSH = 500  # Buffered messages before the history store writes them
+HISTORY_BATCH = 5000  # Rows per transaction when importing
+RULES_FILE = os.path.join(os.path.expanduser("~"), ".jack_chat_rules.json")
+SNAPSHOT_FILE = os.path.join(os.path.expanduser("~"), ".jack_chat_snapshot.json")
+
+class HistoryStore:
+    """Local message history in SQLite; live messages are buffered and written in batches"""
+    def __init__(self, path=HISTORY_FILE):
+        self.db = sqlite3.connect(path)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS messages "
+            "(id TEXT, room TEXT, ts REAL, timestamp TEXT, username TEXT, message TEXT)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS messages_room_ts ON messages (room, ts)")
+        self.db.execute("CREATE UNIQUE INDEX IF NOT EXISTS messages_id ON messages (id) WHERE id IS NOT NULL")
+        # System lines and messages from clients without ids are unique by content and arrival time
+        try:
+            self.create_content_index()
+        except sqlite3.IntegrityError:
+            with self.db:
+                self.db.execute(
+                    "DELETE FROM messages WHERE id IS NULL AND rowid NOT IN "
+                    "(SELECT MIN(rowid) FROM messages WHERE id IS NULL GROUP BY room, ts, username, message)"
+                )
+            self.create_content_index()
+        self.pending = []
+        self.pending_edits = []
+    
+    def add(self, room, timestamp, username, message, message_id=None, ts=None):
+        self.pending.append((message_id, room, ts or time.time(), timestamp, username, message))
+        if len(self.pending) >= HISTORY_FLUSH:
+            self.flush()
+    
+    def edit(self, message_id, message):
+        self.pending_edits.append((message, message_id))
+    
+    def flush(self):
+        if not self.pending and not self.pending_edits:
+            return
+        rows, self.pending = self.pending, []
+        edits, self.pending_edits = self.pending_edits, []
+        with self.db:
+            self.insert_rows(rows)
+            self.db.executemany("UPDATE messages SET message = ? WHERE id = ?", edits)
+    
+    def create_content_index(self):
+        self.db.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS messages_content ON messages (room, ts, username, message) "
+            "WHERE id IS NULL"
+        )
+    
+    def insert_rows(self, rows):
+        """Insert rows, skipping ones already stored; returns how many were new"""
+        return self.db.executemany("INSERT OR IGNORE INTO messages VALUES (?, ?, ?, ?, ?, ?)", rows).rowcount
+    
+    def iter_messages(self, room=None, user=None, since=None, until=None):
+        """Stream matching messages oldest first; SQLite steps the cursor lazily"""
+        self.flush()
+        clauses, params = [], []
+        for clause, value in (("room = ?", room), ("username = ?", user), ("ts >= ?", since), ("ts < ?", until)):
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+        query = "SELECT id, room, ts, timestamp, username, message FROM messages"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        for message_id, room, ts, timestamp, username, message in self.db.execute(query + " ORDER BY ts", params):
+            yield {"kind": "message", "id": message_id, "room": room, "ts": ts,
+                   "timestamp": timestamp, "username": username, "message": message}
+    
+    def close(self):
+        self.flush()
+        self.db.close()
+
+def open_history_stream(path, mode):
+    """Open a JSONL file, compressed according to its extension (.gz, .bz2, .xz, .zst)"""
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    if path.endswith(".bz2"):
+        import bz2
+        return bz2.open(path, mode + "t", encoding="utf-8")
+    if path.endswith(".xz"):
+        import lzma
+        return lzma.open(path, mode + "t", encoding="utf-8")
+    if path.endswith(".zst"):
+        try:
+            import zstandard
+        except ImportError:
+            raise RuntimeError("Install the 'zstandard' package to read or write .zst files")
+        raw = open(path, mode + "b")
+        if mode == "w":
+            stream = zstandard.ZstdCompressor().stream_writer(raw, closefd=True)
+        else:
+            stream = zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+        return io.TextIOWrapper(stream, encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+def load_legacy_data(json_file, pickle_file):
+    """Per-user data from a JSON file, falling back to its legacy pickle"""
+    for path, loader, file_mode in ((json_file, json.load, 'r'), (pickle_file, pickle.load, 'rb')):
+        try:
+            if os.path.exists(path):
+                with open(path, file_mode) as f:
+                    return loader(f)
+        except Exception:
+            continue
+    return {}
+
+LEGACY_KINDS = ("rooms", "invitations")
+
+def legacy_sources():
+    """JSON file and legacy pickle for each kind of per-user data"""
+    home = os.path.expanduser("~")
+    return {
+        "rooms": (CHATROOMS_FILE, os.path.join(home, ".jack_chat_rooms.pkl")),
+        "invitations": (INVITATIONS_FILE, os.path.join(home, ".jack_chat_invitations.pkl"))
+    }
+
+def legacy_records(user=None):
+    """Chatroom lists and stored invitations as export records"""
+    for kind, (json_file, pickle_file) in legacy_sources().items():
+        for username, values in load_legacy_data(json_file, pickle_file).items():
+            if user is None or username == user:
+                yield {"kind": kind, "username": username, kind: values}
+
+def filter_records(records, room=None, user=None, since=None, until=None):
+    for record in records:
+        if record.get("kind") == "message":
+            if room is not None and record.get("room") != room:
+                continue
+            ts = record.get("ts") or 0
+            if (since is not None and ts < since) or (until is not None and ts >= until):
+                continue
+        elif room is not None:
+            continue
+        if user is not None and record.get("username") != user:
+            continue
+        yield record
+
+def batched(records, size):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def export_history(path, room=None, user=None, since=None, until=None, store=None):
+    """Stream history (plus chatroom lists and invitations) to a JSONL file; returns the record count"""
+    store = store or HistoryStore()
+    records = store.iter_messages(room, user, since, until)
+    if room is None:
+        records = itertools.chain(legacy_records(user), records)
+    count = 0
+    with open_history_stream(path, "w") as out:
+        for record in records:
+            out.write(json.dumps(record, separators=(",", ":")) + "\n")
+            count += 1
+    return count
+
+def merge_legacy(kind, username, values):
+    """Merge imported chatrooms or invitations into the JSON files, skipping duplicates"""
+    json_file, pickle_file = legacy_sources()[kind]
+    data = load_legacy_data(json_file, pickle_file)
+    existing = data.setdefault(username, [])
+    for value in values:
+        if value not in existing:
+            existing.append(value)
+    with open(json_file, 'w') as f:
+        json.dump(data, f, indent=4)
+
+def import_history(path, room=None, user=None, since=None, until=None, store=None):
+    """Stream a JSONL export into the local store in large batches; returns counts per kind"""
+    store = store or HistoryStore()
+    counts = Counter()
+    
+    # Carry over any local legacy pickles in the same pass
+    for kind, (json_file, pickle_file) in legacy_sources().items():
+        if os.path.exists(pickle_file) and not os.path.exists(json_file):
+            for username, values in load_legacy_data(json_file, pickle_file).items():
+                merge_legacy(kind, username, values)
+                counts[f"legacy {kind}"] += 1
+    
+    with open_history_stream(path, "r") as stream:
+        records = filter_records((json.loads(line) for line in stream if line.strip()), room, user, since, until)
+        for batch in batched(records, HISTORY_BATCH):
+            rows = []
+            for record in batch:
+                kind = record.get("kind")
+                if kind == "message":
+                    rows.append((record.get("id"), record.get("room"), record.get("ts"), record.get("timestamp"),
+                                 record.get("username"), record.get("message")))
+                    continue
+                if kind in LEGACY_KINDS:
+                    merge_legacy(kind, record["username"], record.get(kind, []))
+                counts[kind] += 1
+            if rows:
+                with store.db:
+                    added = store.insert_rows(rows)
+                counts["message"] += added
+                counts["duplicate message"] += len(rows) - added
+    return counts
@@ -0,0 +1,307 @@
+"""Message rendering shared by both front-ends, without importing a GUI toolkit.
+
+LaneScheduler carries work from the network thread to the UI thread,
+RenderGovernor picks the detail level, and ChatView writes the lines into any
+widget with the Tk Text API.
+"""
+import time
+from collections import deque
+
+from .protocol import username_color
+
+# Max items per drain, highest priority first: invitations, out-of-band status notices,
+# then everything from the room (messages, edits, receipts) in arrival order
+LANE_BUDGETS = (("control", None), ("system", 50), ("chat", 200))
+LANE_FRAME_BUDGET = 0.012  # Seconds of chat rendering per drain before yielding to Tk
+LANE_INTERVAL_MS = 5  # Delay before the next drain when work is left over
+RENDER_DEGRADE_BACKLOG = 200  # Queued messages that count as a busy frame
+RENDER_DEGRADE_FRAMES = 5  # Consecutive busy frames before switching to plain rendering
+RENDER_RECOVER_SECONDS = 2  # Empty backlog needed before full styling comes back
+MAX_DISPLAY_LINES = 5000  # Older lines are trimmed from the chat display
+TRIM_CHUNK = 500  # Trim in chunks so it doesn't happen on every message
+
+class LaneScheduler:
+    """Prioritized inbound lanes drained on the Tk thread.
+    
+    The network thread posts work to a lane; each drain runs every control item,
+    then up to each lane's budget, and chat rendering also stops at a time budget.
+    Leftovers wait for the next drain, so a chat flood can't delay invitations.
+    """
+    def __init__(self, master, budgets=LANE_BUDGETS, frame_budget=LANE_FRAME_BUDGET, clock=time.perf_counter):
+        self.master = master
+        self.clock = clock
+        self.budgets = budgets
+        self.frame_budget = frame_budget
+        self.lanes = {name: deque() for name, _ in budgets}
+        self.scheduled = False
+        self.after_drain = None  # Called with (seconds spent, items left) after each drain
+    
+    def post(self, lane, func, *args):
+        self.lanes[lane].append((func, args))
+        if not self.scheduled:
+            self.scheduled = True
+            self.master.after(0, self.drain)
+    
+    def pending(self):
+        return sum(len(queue) for queue in self.lanes.values())
+    
+    def drain(self):
+        started = self.clock()
+        deadline = started + self.frame_budget
+        for name, budget in self.budgets:
+            queue = self.lanes[name]
+            count = 0
+            while queue and (budget is None or count < budget):
+                if budget is not None and count and self.clock() > deadline:
+                    break
+                func, args = queue.popleft()
+                try:
+                    func(*args)
+                except Exception as e:
+                    print(f"Error handling {name} message: {e}")
+                count += 1
+        
+        if self.after_drain is not None:
+            self.after_drain(self.clock() - started, self.pending())
+        
+        # Clear the flag before looking again, so a concurrent post is never lost
+        self.scheduled = False
+        if self.pending() and not self.scheduled:
+            self.scheduled = True
+            self.master.after(LANE_INTERVAL_MS, self.drain)
+
+class RenderGovernor:
+    """Chooses full or plain rendering from the lane backlog and the cost of each drain.
+    
+    Rendering steps down to plain text after several frames in a row that run over
+    budget with a deep backlog, and back up once the backlog has stayed empty for
+    RENDER_RECOVER_SECONDS, so a borderline room doesn't flap between modes.
+    """
+    def __init__(self, frame_budget=LANE_FRAME_BUDGET):
+        self.frame_budget = frame_budget
+        self.mode = "full"
+        self.frame_cost = 0.0  # Moving average of seconds per drain
+        self.busy_frames = 0
+        self.calm_since = None
+    
+    def observe(self, elapsed, backlog, now=None):
+        """Record one drain; returns True when rendering should step down"""
+        self.frame_cost += (elapsed - self.frame_cost) * 0.2
+        if self.mode == "plain":
+            if backlog:
+                self.calm_since = None
+            elif self.calm_since is None:
+                self.calm_since = time.monotonic() if now is None else now
+            return False
+        
+        if backlog >= RENDER_DEGRADE_BACKLOG and self.frame_cost >= self.frame_budget * 0.8:
+            self.busy_frames += 1
+        else:
+            self.busy_frames = 0
+        if self.busy_frames >= RENDER_DEGRADE_FRAMES:
+            self.mode, self.busy_frames, self.calm_since = "plain", 0, None
+            return True
+        return False
+    
+    def recover(self, backlog, now=None):
+        """Returns True when full styling should come back"""
+        now = time.monotonic() if now is None else now
+        if self.mode == "plain" and not backlog and self.calm_since is not None \
+                and now - self.calm_since >= RENDER_RECOVER_SECONDS:
+            self.mode = "full"
+            return True
+        return False
+
+class ChatView:
+    """Chat lines in a Text widget: the render path both front-ends share.
+    
+    Username tags are configured once and cached. Messages with an id are
+    bracketed by marks so edits can find them, and highlights are tagged. Under
+    sustained load (see RenderGovernor) each frame's lines go in as one plain
+    insert. The widget is trimmed to MAX_DISPLAY_LINES. Only the Text API is
+    used, so any widget (or stand-in) that provides it will do.
+    """
+    def __init__(self, master, text, lanes=None, fonts=None, colors=None):
+        self.master = master
+        self.text = text
+        self.fonts = fonts or {}  # "timestamp", "username", "message", "deleted"
+        self.colors = dict(colors or {})  # username -> color instead of username_color()
+        self.user_tags = set()
+        self.marks = {}  # message id -> (mark number, author); oldest first
+        self.mark_counter = 0
+        self.latest = None  # (message id, mark number, author) of the newest marked message
+        self.governor = RenderGovernor()
+        self.batch = []
+        self.recover_job = None
+        self.listener = None  # Called with (timestamp, username, message, tag name, message id) per line shown
+        self.on_mode_change = None
+        self.lanes = lanes
+        if lanes is not None:
+            lanes.after_drain = self.frame_drained
+    
+    def configure_tags(self):
+        """Base tags first: Tk gives later tags priority, so deleted and highlight win over message"""
+        self.text.tag_config("timestamp", foreground="#AAAAAA", font=self.fonts.get("timestamp"))
+        self.text.tag_config("message", foreground="#FFFFFF", font=self.fonts.get("message"))
+        self.text.tag_config("system", foreground="#FFC107", font=self.fonts.get("username"))
+        self.text.tag_config("deleted", foreground="#777777", font=self.fonts.get("deleted"))
+        self.text.tag_config("highlight", background="#5C4B00", foreground="#FFF07C")
+        self.text.tag_raise("deleted")
+        self.text.tag_raise("highlight")
+    
+    def tag_for(self, username):
+        if username == "System":
+            return "system"
+        tag_name = f"user_{username}"
+        if tag_name not in self.user_tags:
+            self.user_tags.add(tag_name)
+            color = self.colors.get(username) or username_color(username)
+            self.text.tag_config(tag_name, foreground=color, font=self.fonts.get("username"))
+        return tag_name
+    
+    def set_color(self, username, color):
+        self.colors[username] = color
+        self.user_tags.discard(f"user_{username}")
+        self.tag_for(username)
+    
+    def render(self, timestamp, username, message, message_id=None, highlights=()):
+        """Show a message now, or queue it for the frame's plain insert under load"""
+        if self.governor.mode == "plain":
+            self.batch.append((timestamp, username, message, message_id, highlights))
+        else:
+            self.show(timestamp, username, message, self.tag_for(username), message_id, highlights)
+    
+    def show(self, timestamp, username, message, tag_name, message_id=None, highlights=()):
+        """Insert one fully styled message"""
+        text = self.text
+        text.config(state="normal")
+        should_scroll = text.yview()[1] > 0.9
+        
+        text.insert("end", f"\n[{timestamp}] ", "timestamp")
+        text.insert("end", f"{username}: ", tag_name)
+        message_start = text.index("end-1c")
+        if message_id and message_id not in self.marks:
+            self.mark_counter += 1
+            start, end = f"m{self.mark_counter}s", f"m{self.mark_counter}e"
+            text.mark_set(start, "end-1c")
+            text.mark_gravity(start, "left")
+            text.insert("end", message, "message")
+            text.mark_set(end, "end-1c")
+            text.mark_gravity(end, "left")
+            text.insert("end", "\n", "message")
+            self.marks[message_id] = (self.mark_counter, username)
+            self.latest = (message_id, self.mark_counter, username)
+        else:
+            text.insert("end", f"{message}\n", "message")
+        
+        for start, end in highlights:
+            text.tag_add("highlight", f"{message_start}+{start}c", f"{message_start}+{end}c")
+        
+        self.trim()
+        if should_scroll:
+            text.yview_moveto(1.0)
+        text.config(state="disabled")
+        if self.listener is not None:
+            self.listener(timestamp, username, message, tag_name, message_id)
+    
+    def flush(self):
+        """Insert the frame's queued messages as one untagged block, keeping edit marks and highlights"""
+        if not self.batch:
+            return
+        batch, self.batch = self.batch, []
+        text = self.text
+        text.config(state="normal")
+        should_scroll = text.yview()[1] > 0.9
+        base = text.index("end-1c")
+        
+        parts, offset, placed = [], 0, []
+        for timestamp, username, message, message_id, highlights in batch:
+            prefix = f"\n[{timestamp}] {username}: "
+            start = offset + len(prefix)
+            parts.append(f"{prefix}{message}\n")
+            offset = start + len(message) + 1
+            placed.append((start, message_id, username, highlights, len(message)))
+        text.insert("end", "".join(parts), "message")
+        
+        for start, message_id, username, highlights, length in placed:
+            if message_id and message_id not in self.marks:
+                self.mark_counter += 1
+                for mark, position in ((f"m{self.mark_counter}s", start), (f"m{self.mark_counter}e", start + length)):
+                    text.mark_set(mark, f"{base}+{position}c")
+                    text.mark_gravity(mark, "left")
+                self.marks[message_id] = (self.mark_counter, username)
+                self.latest = (message_id, self.mark_counter, username)
+            for begin, end in highlights:
+                text.tag_add("highlight", f"{base}+{start + begin}c", f"{base}+{start + end}c")
+        
+        self.trim()
+        if should_scroll:
+            text.yview_moveto(1.0)
+        text.config(state="disabled")
+        if self.listener is not None:
+            for timestamp, username, message, message_id, highlights in batch:
+                self.listener(timestamp, username, message, "system" if username == "System" else "message",
+                              message_id)
+    
+    def append_system(self, line):
+        """A local notice such as "--- You have joined ... ---" """
+        self.text.config(state="normal")
+        self.text.insert("end", line + "\n", "system")
+        self.text.config(state="disabled")
+    
+    def frame_drained(self, elapsed, backlog):
+        """Lane scheduler hook: flush batched lines and adjust the render detail level"""
+        self.flush()
+        if self.governor.observe(elapsed, backlog) and self.on_mode_change is not None:
+            self.on_mode_change()
+        if self.governor.mode == "plain" and not backlog and self.recover_job is None:
+            self.recover_job = self.master.after(RENDER_RECOVER_SECONDS * 1000, self.check_recovery)
+    
+    def check_recovery(self):
+        self.recover_job = None
+        backlog = self.lanes.pending() if self.lanes is not None else 0
+        if self.governor.recover(backlog):
+            if self.on_mode_change is not None:
+                self.on_mode_change()
+        elif self.governor.mode == "plain" and not backlog:
+            self.recover_job = self.master.after(RENDER_RECOVER_SECONDS * 1000, self.check_recovery)
+    
+    def change(self, message_id, author, new_text, tags="message"):
+        """Replace a marked message's text (edit or delete); False if unknown, trimmed or not the author's"""
+        self.flush()  # The message may still be in this frame's plain batch
+        entry = self.marks.get(message_id)
+        if entry is None or entry[1] != author:
+            return False
+        start, end = f"m{entry[0]}s", f"m{entry[0]}e"
+        self.text.config(state="normal")
+        self.text.delete(start, end)
+        self.text.insert(start, new_text, tags)
+        self.text.mark_set(end, f"{start}+{len(new_text)}c")
+        self.text.config(state="disabled")
+        return True
+    
+    def trim(self):
+        """Drop the oldest lines once the display grows past MAX_DISPLAY_LINES"""
+        lines = int(self.text.index("end-1c").split(".")[0])
+        if lines <= MAX_DISPLAY_LINES + TRIM_CHUNK:
+            return
+        self.text.delete("1.0", f"{lines - MAX_DISPLAY_LINES}.0")
+        
+        # Compact marks (and tombstones) of messages whose text was trimmed away
+        for message_id in list(self.marks):
+            number, _ = self.marks[message_id]
+            if self.text.compare(f"m{number}e", ">", "1.0"):
+                break
+            self.text.mark_unset(f"m{number}s", f"m{number}e")
+            del self.marks[message_id]
+    
+    def clear(self):
+        """Empty the display, e.g. when switching rooms"""
+        self.text.config(state="normal")
+        self.text.delete("1.0", "end")
+        self.text.config(state="disabled")
+        for number, _ in self.marks.values():
+            self.text.mark_unset(f"m{number}s", f"m{number}e")
+        self.marks = {}
+        self.latest = None
+        self.batch = []
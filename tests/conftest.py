@@ -0,0 +1,8 @@
+"""Run the suite from a scratch home directory, against the checkout's jack_chat."""
+import os
+import sys
+import tempfile
+
+# jack_chat.storage resolves its file names from the home directory at import time
+os.environ["HOME"] = tempfile.mkdtemp(prefix="jack_chat_tests_")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,225 @@
+import asyncio
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+
+from jack_chat.app import RoomIndex, create_headless_app
+from jack_chat.core import ChatRules
+from jack_chat.storage import HistoryStore
+from jack_chat.protocol import LoopbackBus, LoopbackClient, LoopbackMessage, room_topic
+
+
+def test_room_index_substring_search():
+    index = RoomIndex(["General", "python-help", "off-topic", "Pythonistas"])
+    assert index.search("") == ["General", "python-help", "off-topic", "Pythonistas"]
+    assert index.search("pyt") == ["python-help", "Pythonistas"]
+    assert index.search("pyth") == ["python-help", "Pythonistas"]  # Narrowed from the last results
+    assert index.search("-") == ["python-help", "off-topic"]
+    assert index.search("topic") == ["off-topic"]
+    assert index.search("zzz") == []
+
+
+class RecordingView:
+    """Just enough of ChatView to see the order messages, edits and receipts reach it"""
+    def __init__(self):
+        self.events = []
+        self.marks = {}
+        self.latest = None
+
+    def render(self, timestamp, username, message, message_id=None, highlights=()):
+        if message_id:
+            self.marks[message_id] = (len(self.marks) + 1, username)
+        self.events.append(("show", message_id or message))
+
+    def flush(self):
+        pass
+
+    def change(self, message_id, author, new_text, tags="message"):
+        found = message_id in self.marks
+        self.events.append(("change", message_id, found))
+        return found
+
+
+def deliver(app, topic, **payload):
+    app.on_message(app.client, None, LoopbackMessage(topic, json.dumps(payload).encode(), None, 0))
+
+
+def test_edits_receipts_and_system_lines_keep_arrival_order():
+    app = create_headless_app("bob", "room")
+    app.view = RecordingView()
+    deliver(app, app.chat_topic, username="alice", message="hi", timestamp="t", id="abc")
+    deliver(app, app.chat_topic, type="edit", username="alice", message="hello", id="abc")
+    deliver(app, app.receipt_topic, username="carol", last="abc")
+    deliver(app, app.chat_topic, username="System", message="carol has joined the chat", timestamp="t")
+    app.master.run()
+    assert app.view.events == [("show", "abc"), ("change", "abc", True), ("show", "carol has joined the chat")]
+    assert app.receipts.seen_by(1) == 1
+
+
+def test_room_switch_drops_queued_work_but_keeps_its_history(tmp_path):
+    app = create_headless_app("bob", "room")
+    app.history = HistoryStore(str(tmp_path / "history.db"))
+    deliver(app, app.chat_topic, username="alice", message="old room", timestamp="t", id="abc")
+    deliver(app, app.chat_topic, type="edit", username="alice", message="edited", id="abc")
+    app.chatroom, app.room_visit = "other", app.room_visit + 1  # What change_to_chatroom does first
+    app.master.run()
+    assert list(app.rendered_lines) == []
+    assert app.recent_messages.get("other") is None
+    assert [(m["room"], m["message"]) for m in app.history.iter_messages()] == [("room", "old room")]
+    app.history.close()
+
+
+def publish(client, room, message, username="alice"):
+    client.publish(room_topic(room), json.dumps({"username": username, "message": message, "timestamp": "t"}))
+
+
+def test_headless_app_renders_and_applies_rules():
+    app = create_headless_app("bob", "room")
+    app.rules = ChatRules("bob", muted=["mallory"])
+    for username in ("alice", "mallory"):
+        payload = json.dumps({"username": username, "message": "hi bob", "timestamp": "t"}).encode()
+        app.on_message(app.client, None, LoopbackMessage(app.chat_topic, payload, None, 0))
+    app.master.run()
+    assert list(app.rendered_lines) == ["[t] alice: hi bob"]
+
+
+def test_shared_group_workers_split_a_room():
+    bus = LoopbackBus()
+    workers = [create_headless_app(f"worker{i}", "room", bus=bus, share_group="archivers") for i in range(2)]
+    publisher = LoopbackClient(bus)
+    publisher.connect()
+    for i in range(4):
+        publish(publisher, "room", f"m{i}")
+    bus.pump()
+    for worker in workers:
+        worker.master.run()
+    assert [list(worker.rendered_lines) for worker in workers] == [
+        ["[t] alice: m0", "[t] alice: m2"], ["[t] alice: m1", "[t] alice: m3"]
+    ]
+
+
+def test_window_clients_never_share():
+    app = create_headless_app("bob", "room")
+    assert app.subscription_topic(app.chat_topic) == app.chat_topic
+
+
+def start_standin_broker():
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+    import standin_broker
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    threading.Thread(target=asyncio.run, args=(standin_broker.serve(port, 0),), daemon=True).start()
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return port
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError("stand-in broker did not start")
+
+
+def test_shared_group_workers_archive_a_room_on_a_broker(tmp_path):
+    port = start_standin_broker()
+    workers, ready, archived = [], threading.Barrier(3), {}
+
+    def work(i):
+        history = HistoryStore(str(tmp_path / f"worker{i}.db"))  # SQLite connections stay on their thread
+        worker = create_headless_app(f"worker{i}", "room", share_group="archivers", transport="tcp",
+                                     broker=("127.0.0.1", port), history=history)
+        workers.append(worker)
+        ready.wait()
+        worker.master.run()
+        archived[i] = [m["message"] for m in history.iter_messages()]
+        history.close()
+
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(2)]
+    for thread in threads:
+        thread.start()
+    ready.wait()
+    time.sleep(0.3)  # Let both subscriptions reach the broker
+
+    publisher = mqtt.Client()
+    publisher.connect("127.0.0.1", port)
+    publisher.loop_start()
+    for i in range(4):
+        publisher.publish(room_topic("room"), json.dumps({"username": "alice", "message": f"m{i}",
+                                                          "timestamp": "t", "id": f"id{i}"}))
+    deadline = time.monotonic() + 5
+    while sum(len(w.rendered_lines) for w in workers) < 4 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    publisher.loop_stop()
+    for worker in workers:
+        worker.client.disconnect()
+        worker.master.destroy()
+    for thread in threads:
+        thread.join(5)
+
+    assert sorted(archived.values()) == [["m0", "m2"], ["m1", "m3"]]
+
+
+class StubVar:
+    def set(self, value):
+        self.value = value
+
+
+def make_migrating_app(port):
+    app = create_headless_app("bob", "room")
+    app.client.connect()
+    app.broker = ("127.0.0.1", port)
+    app.broker_probes, app.failed_brokers, app.migration = {}, set(), None
+    app.status_var = StubVar()
+    return app
+
+
+def test_failed_migration_keeps_the_live_connection():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        closed_port = probe.getsockname()[1]
+    app = make_migrating_app(1883)
+    live = app.client
+    target = ("127.0.0.1", closed_port)
+    app.migrate_to_broker(target, announcement="bob has joined the chat")
+    app.migration.join(10)
+    app.master.run()
+    assert app.client is live and live.connected
+    assert app.broker == ("127.0.0.1", 1883)
+    assert target in app.failed_brokers and not app.broker_probes[target]["healthy"]
+
+
+def test_migration_switches_clients_once_connected():
+    port = start_standin_broker()
+    app = make_migrating_app(1883)
+    old = app.client
+    app.migrate_to_broker(("127.0.0.1", port))
+    app.migration.join(10)
+    app.master.run()
+    assert app.broker == ("127.0.0.1", port)
+    assert app.client is not old and not old.connected
+    deadline = time.monotonic() + 5
+    while not app.client.is_connected() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert app.client.is_connected()
+    app.client.disconnect()
+
+
+def test_snapshot_round_trip(tmp_path, monkeypatch):
+    from jack_chat import app as app_module
+    monkeypatch.setattr(app_module, "SNAPSHOT_FILE", str(tmp_path / "snapshot.json"))
+    app = create_headless_app("bob", "room")
+    app.user_chatrooms = ["room"]
+    app.my_color, app.my_color_name = "#123456", "custom"
+    app.recent_messages = {"room": [("12:00", "alice", "hi", "user_alice", "m1")],
+                           "gone": [("12:01", "carol", "bye", "user_carol")]}
+    app.save_snapshot()
+    snapshot = app.load_snapshot()
+    assert snapshot["username"] == "bob" and snapshot["chatroom"] == "room"
+    assert snapshot["rooms"] == {"room": [["12:00", "alice", "hi", "user_alice", "m1"]]}
+    open(app_module.SNAPSHOT_FILE, "w").close()
+    assert app.load_snapshot() is None
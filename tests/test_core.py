@@ -0,0 +1,103 @@
+import threading
+import time
+
+import pytest
+
+from jack_chat.core import KeywordAutomaton, ChatRules, ReadReceipts, TypingTracker, HeadlessMaster, Diagnostics
+
+
+def test_automaton_finds_overlapping_keywords():
+    automaton = KeywordAutomaton([("he", 0), ("she", 0), ("hers", 1)])
+    assert sorted(automaton.search("ushers")) == [(1, 4, 0), (2, 4, 0), (2, 6, 1)]
+
+
+def test_automaton_is_case_insensitive():
+    automaton = KeywordAutomaton([("Deploy", 0)])
+    assert list(automaton.search("DEPLOY now")) == [(0, 6, 0)]
+
+
+def test_rules_highlight_username_and_keywords_as_whole_words():
+    rules = ChatRules("al", ["deploy", "c++"])
+    assert rules.evaluate("bob", "also al said") == [(5, 7)]
+    assert rules.evaluate("bob", "deployment done") == []
+    assert rules.evaluate("bob", "deploy, al!") == [(0, 6), (8, 10)]
+    assert rules.evaluate("bob", "I like c++ a lot") == [(7, 10)]
+
+
+def test_rules_merge_overlapping_spans():
+    rules = ChatRules("", ["new york", "york city"])
+    assert rules.evaluate("bob", "new york city") == [(0, 13)]
+
+
+def test_rules_mute_and_hide():
+    rules = ChatRules("al", muted=["Spammer"], hide=["buy now", "re:free\\s+money"])
+    assert rules.evaluate("spammer", "hello") is None
+    assert rules.evaluate("bob", "please BUY NOW") is None
+    assert rules.evaluate("bob", "free   money here") is None
+    assert rules.evaluate("bob", "hello al") == [(6, 8)]
+
+
+def test_rules_skip_invalid_regex():
+    rules = ChatRules("", hide=["re:("])
+    assert rules.hide_regex is None
+    assert rules.evaluate("bob", "(") == []
+
+
+def test_receipts_count_members_who_read_up_to_a_sequence():
+    receipts = ReadReceipts()
+    receipts.update("alice", 5)
+    receipts.update("bob", 3)
+    receipts.update("bob", 2)  # Receipts never move backwards
+    assert receipts.dirty
+    assert receipts.seen_by(3) == 2
+    assert receipts.seen_by(4) == 1
+    assert receipts.seen_by(3, exclude=["alice"]) == 1
+    assert receipts.seen_by(6) == 0
+
+
+def test_typing_tracker_expires_typists():
+    tracker = TypingTracker(ttl=5)
+    tracker.update("alice", True, now=0)
+    tracker.update("bob", True, now=3)
+    tracker.expire(now=6)
+    assert list(tracker.typists) == ["bob"]
+    tracker.update("bob", False, now=7)
+    assert not tracker.typists
+
+
+def test_headless_master_skips_idle_time_but_counts_callback_time():
+    master = HeadlessMaster()
+    seen = []
+    master.after(0, time.sleep, 0.02)
+    master.after(0, lambda: seen.append(master.clock()))  # Queued behind the slow callback
+    master.after(60000, lambda: seen.append(master.clock()))
+    started = time.perf_counter()
+    master.run()
+    assert time.perf_counter() - started < 1  # The minute of idle time was skipped
+    assert 0.02 <= seen[0] < 1
+    assert seen[1] >= 60
+
+
+def test_headless_master_modeled_cost_is_reproducible():
+    master = HeadlessMaster(callback_cost=0.001)
+    for _ in range(3):
+        master.after(0, time.sleep, 0.005)
+    master.run()
+    assert master.now == pytest.approx(0.003)
+
+
+def test_stopping_the_sampler_mid_pass_writes_its_samples():
+    master = HeadlessMaster()
+    diagnostics = Diagnostics(master)
+    busy = threading.Event()
+    worker = threading.Thread(target=busy.wait, name="busy-worker", daemon=True)
+    worker.start()
+    assert diagnostics.start(sampling=True, seconds=60)
+    time.sleep(0.05)
+    path = diagnostics.stop()  # Called from another thread while the sampler runs
+    busy.set()
+    assert not diagnostics.sampler and not diagnostics.active
+    with open(path) as f:
+        report = f.read()
+    assert "=== Sampling profiler:" in report
+    assert "[busy-worker]" in report
@@ -0,0 +1,178 @@
+import json
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+
+from jack_chat import protocol
+
+from jack_chat.protocol import (
+    LoopbackBus, LoopbackClient, MulticastClient, UnixSocketClient, create_mqtt_client, multicast_group,
+    rank_brokers, choose_broker, chat_fields, BrokerProber
+)
+
+
+def make_loopback(bus, *topics):
+    client = LoopbackClient(bus)
+    client.received = []
+    client.on_message = lambda c, userdata, msg: client.received.append((msg.topic, msg.payload))
+    client.connect()
+    for topic in topics:
+        client.subscribe(topic)
+    return client
+
+
+def test_loopback_delivers_exact_and_wildcard_subscriptions():
+    bus = LoopbackBus()
+    exact = make_loopback(bus, "jack-chat/room")
+    wildcard = make_loopback(bus, "jack-chat/#")
+    other = make_loopback(bus, "jack-chat/other")
+    assert bus.publish("jack-chat/room", b"hi") == 2
+    assert bus.pump() == 2
+    assert exact.received == wildcard.received == [("jack-chat/room", b"hi")]
+    assert other.received == []
+
+
+def test_loopback_unsubscribe_and_disconnect_stop_delivery():
+    bus = LoopbackBus()
+    client = make_loopback(bus, "jack-chat/a", "jack-chat/+/typing")
+    client.unsubscribe("jack-chat/a")
+    bus.publish("jack-chat/a", b"1")
+    bus.publish("jack-chat/a/typing", b"2")
+    bus.pump()
+    client.disconnect()
+    bus.publish("jack-chat/a/typing", b"3")
+    bus.pump()
+    assert client.received == [("jack-chat/a/typing", b"2")]
+
+
+def test_loopback_keeps_order_per_client_across_threads():
+    bus = LoopbackBus()
+    client = make_loopback(bus, "jack-chat/room")
+    thread = threading.Thread(target=client.loop_forever)
+    thread.start()
+    for i in range(100):
+        bus.publish("jack-chat/room", str(i).encode())
+    deadline = time.monotonic() + 5
+    while len(client.received) < 100 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    client.disconnect()
+    thread.join(2)
+    assert [int(payload) for _, payload in client.received] == list(range(100))
+
+
+def test_create_mqtt_client_per_transport():
+    assert type(create_mqtt_client("tcp")) is mqtt.Client
+    assert isinstance(create_mqtt_client("unix"), UnixSocketClient)
+    assert isinstance(create_mqtt_client("loopback", bus=LoopbackBus()), LoopbackClient)
+    assert isinstance(create_mqtt_client("multicast"), MulticastClient)
+
+
+def test_loopback_bus_splits_shared_subscriptions():
+    bus = LoopbackBus()
+    workers = [LoopbackClient(bus) for _ in range(2)]
+    received = {id(worker): [] for worker in workers}
+    for worker in workers:
+        worker.on_message = lambda c, userdata, msg: received[id(c)].append(msg.payload)
+        worker.connect()
+        worker.subscribe("$share/archivers/jack-chat/+")
+    publisher = LoopbackClient(bus)
+    publisher.connect()
+    for i in range(4):
+        publisher.publish("jack-chat/room", str(i))
+    bus.pump()
+    assert sorted(received.values()) == [[b"0", b"2"], [b"1", b"3"]]
+
+
+class RecordingSocket:
+    """Collects what a MulticastClient sends instead of touching the network"""
+    def __init__(self):
+        self.sent = []
+        self.options = []
+
+    def setsockopt(self, *option):
+        self.options.append(option)
+
+    def sendto(self, datagram, address):
+        self.sent.append((datagram, address[0]))
+
+
+def make_multicast():
+    client = MulticastClient()
+    client.sock = RecordingSocket()
+    client.received = []
+    client.on_message = lambda c, userdata, msg: client.received.append((msg.topic, msg.payload))
+    return client
+
+
+def test_multicast_drops_duplicate_datagrams():
+    sender, receiver = make_multicast(), make_multicast()
+    receiver.subscribe("jack-chat/one")
+    sender.publish("jack-chat/one", "hello")
+    datagram, _ = sender.sock.sent[0]
+    assert receiver.handle_datagram(datagram)
+    assert not receiver.handle_datagram(datagram)
+    assert receiver.received == [("jack-chat/one", b"hello")]
+
+
+def test_multicast_nacks_gaps_on_the_datagrams_group():
+    sender, receiver = make_multicast(), make_multicast()
+    receiver.subscribe("jack-chat/one")
+    for i in range(4):
+        sender.publish("jack-chat/one", f"m{i}")
+    datagrams = [datagram for datagram, _ in sender.sock.sent]
+    receiver.handle_datagram(datagrams[0])
+    receiver.handle_datagram(datagrams[3])
+
+    (nack, group), = receiver.sock.sent
+    assert group == multicast_group("jack-chat/one")
+    _, kind, target, _, first, count = MulticastClient.HEADER.unpack_from(nack)
+    assert (kind, target, first, count) == (MulticastClient.NACK, sender.sender_id, 1, 2)
+
+
+def test_multicast_answers_nacks_only_from_that_groups_window():
+    sender, receiver = make_multicast(), make_multicast()
+    receiver.subscribe("jack-chat/one")
+    for topic in ("jack-chat/one", "jack-chat/two"):
+        for i in range(3):
+            sender.publish(topic, f"m{i}")
+    one = [datagram for datagram, group in sender.sock.sent if group == multicast_group("jack-chat/one")]
+    sender.sock.sent.clear()
+
+    receiver.send_nack(multicast_group("jack-chat/one"), sender.sender_id, 1, 2)
+    (nack, _), = receiver.sock.sent
+    sender.handle_datagram(nack)
+    assert sender.sock.sent == [(one[1], multicast_group("jack-chat/one")), (one[2], multicast_group("jack-chat/one"))]
+
+    # The retransmissions fill the receiver's gap without duplicating what it had
+    receiver.handle_datagram(one[0])
+    for datagram, _ in sender.sock.sent + [(one[0], None)]:
+        receiver.handle_datagram(datagram)
+    assert [payload for _, payload in receiver.received] == [b"m0", b"m1", b"m2"]
+
+
+def test_broker_ranking_is_stable_per_room():
+    brokers = [("a", 1883), ("b", 1883), ("c", 1883)]
+    assert rank_brokers("room", brokers) == rank_brokers("room", list(reversed(brokers)))
+    best = rank_brokers("room", brokers)[0]
+    assert choose_broker("room", brokers, {}) == best
+    assert choose_broker("room", brokers, {best: {"healthy": False}}) == rank_brokers("room", brokers)[1]
+    probes = {("a", 1883): {"healthy": True, "rtt": 0.2}, ("c", 1883): {"healthy": True, "rtt": 0.05}}
+    assert choose_broker("room", brokers, probes, mode="fastest") == ("c", 1883)
+
+
+def test_probe_that_misses_the_deadline_counts_as_unhealthy(monkeypatch):
+    def probe(host, port):
+        if host == "blackhole":
+            time.sleep(3)  # Past the 2 * PROBE_TIMEOUT + 1 deadline
+        return {"healthy": True, "connect": 0.01, "rtt": 0.01}
+    monkeypatch.setattr(protocol, "probe_broker", probe)
+    monkeypatch.setattr(protocol, "PROBE_TIMEOUT", 0.05)
+    brokers = [("blackhole", 1883), ("ok", 1883)]
+    results = BrokerProber(brokers, None).probe_all()
+    assert results[("blackhole", 1883)]["healthy"] is False
+    assert choose_broker("room", brokers, results) == ("ok", 1883)
+
+
+def test_chat_fields_defaults():
+    assert chat_fields(json.loads('{"message": "hi"}')) == ("unknown time", "unknown user", "hi")
@@ -0,0 +1,71 @@
+import json
+
+import pytest
+
+from jack_chat import storage
+from jack_chat.storage import HistoryStore, export_history, import_history
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"))
+    yield store
+    store.close()
+
+
+def fill(store):
+    store.add("general", "12:00:00", "alice", "hello", "id-1", ts=100.0)
+    store.add("general", "12:00:01", "System", "bob has joined the chat", ts=101.0)
+    store.add("other", "12:00:02", "bob", "hi there", "id-2", ts=102.0)
+    store.flush()
+
+
+@pytest.mark.parametrize("name", ["export.jsonl", "export.jsonl.gz", "export.jsonl.bz2", "export.jsonl.xz"])
+def test_export_import_round_trip(tmp_path, store, name):
+    fill(store)
+    path = str(tmp_path / name)
+    assert export_history(path, store=store) == 3
+
+    copy = HistoryStore(str(tmp_path / "copy.db"))
+    assert import_history(path, store=copy)["message"] == 3
+    assert list(copy.iter_messages()) == list(store.iter_messages())
+    copy.close()
+
+
+def test_reimport_skips_messages_with_and_without_ids(tmp_path, store):
+    fill(store)
+    path = str(tmp_path / "export.jsonl")
+    export_history(path, store=store)
+    counts = import_history(path, store=store)
+    assert counts["message"] == 0
+    assert counts["duplicate message"] == 3
+    assert len(list(store.iter_messages())) == 3
+
+
+def test_export_filters(tmp_path, store):
+    fill(store)
+    path = str(tmp_path / "export.jsonl")
+    assert export_history(path, room="general", since=100.5, store=store) == 1
+    with open(path) as f:
+        (record,) = [json.loads(line) for line in f]
+    assert record["username"] == "System"
+
+
+def test_edits_update_stored_messages(store):
+    fill(store)
+    store.edit("id-1", "hello (edited)")
+    messages = {m["id"]: m["message"] for m in store.iter_messages()}
+    assert messages["id-1"] == "hello (edited)"
+
+
+def test_chatroom_lists_travel_with_the_export(tmp_path, store, monkeypatch):
+    rooms_file = tmp_path / "rooms.json"
+    rooms_file.write_text(json.dumps({"alice": ["general", "other"]}))
+    monkeypatch.setattr(storage, "CHATROOMS_FILE", str(rooms_file))
+    monkeypatch.setattr(storage, "INVITATIONS_FILE", str(tmp_path / "invitations.json"))
+    path = str(tmp_path / "export.jsonl")
+    export_history(path, store=store)
+
+    rooms_file.write_text(json.dumps({"alice": ["general"]}))
+    assert import_history(path, store=store)["rooms"] == 1
+    assert json.loads(rooms_file.read_text()) == {"alice": ["general", "other"]}
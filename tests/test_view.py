@@ -0,0 +1,57 @@
+from jack_chat.core import HeadlessMaster
+from jack_chat.view import (
+    LaneScheduler, RenderGovernor, RENDER_DEGRADE_BACKLOG, RENDER_DEGRADE_FRAMES, RENDER_RECOVER_SECONDS
+)
+
+
+def make_scheduler(budgets):
+    master = HeadlessMaster(callback_cost=0)
+    return master, LaneScheduler(master, budgets=budgets, clock=master.clock)
+
+
+def test_lanes_run_control_first_and_respect_budgets():
+    master, lanes = make_scheduler((("control", None), ("system", 1), ("chat", 2)))
+    ran, drains = [], []
+    lanes.after_drain = lambda elapsed, backlog: drains.append(backlog)
+    for i in range(3):
+        lanes.post("chat", ran.append, f"chat{i}")
+    lanes.post("system", ran.append, "system0")
+    lanes.post("system", ran.append, "system1")
+    lanes.post("control", ran.append, "control0")
+    master.run()
+    assert ran == ["control0", "system0", "chat0", "chat1", "system1", "chat2"]
+    assert drains == [2, 0]
+
+
+def test_lanes_survive_failing_items(capsys):
+    master, lanes = make_scheduler((("chat", 10),))
+    ran = []
+    lanes.post("chat", lambda: 1 / 0)
+    lanes.post("chat", ran.append, "after")
+    master.run()
+    assert ran == ["after"]
+    assert "Error handling chat message" in capsys.readouterr().out
+
+
+def test_governor_steps_down_after_sustained_busy_frames():
+    governor = RenderGovernor(frame_budget=0.01)
+    for _ in range(RENDER_DEGRADE_FRAMES - 1):
+        assert not governor.observe(0.02, RENDER_DEGRADE_BACKLOG)
+    governor.observe(0.001, 0)  # One calm frame resets the streak
+    results = [governor.observe(0.02, RENDER_DEGRADE_BACKLOG) for _ in range(RENDER_DEGRADE_FRAMES + 2)]
+    assert results.count(True) == 1
+    assert governor.mode == "plain"
+
+
+def test_governor_recovers_only_after_a_calm_period():
+    governor = RenderGovernor(frame_budget=0.01)
+    for _ in range(RENDER_DEGRADE_FRAMES + 5):
+        governor.observe(0.05, RENDER_DEGRADE_BACKLOG)
+    assert governor.mode == "plain"
+    governor.observe(0.001, 0, now=100)
+    assert not governor.recover(0, now=100 + RENDER_RECOVER_SECONDS / 2)
+    governor.observe(0.001, 10, now=101)  # Backlog came back: the calm period restarts
+    governor.observe(0.001, 0, now=102)
+    assert not governor.recover(0, now=102 + RENDER_RECOVER_SECONDS / 2)
+    assert governor.recover(0, now=102 + RENDER_RECOVER_SECONDS)
+    assert governor.mode == "full"